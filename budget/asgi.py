@@ -0,0 +1,44 @@
+"""
+ASGI config for budget project.
+
+Serves long-lived streams next to budget.wsgi, all other urls stay on wsgi:
+
+    uvicorn budget.asgi:application
+
+Proxy must route /api/v1/user/notifications/stream/ here with buffering off.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budget.settings')
+django.setup(set_prefix=False)
+
+from user.streams import notification_stream, respond  # noqa: E402
+
+routes = {
+    '/api/v1/user/notifications/stream/': notification_stream,
+}
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    handler = routes.get(scope['path']) if scope['type'] == 'http' else None
+    if handler is None:
+        await respond(send, 404, b'Not found.')
+        return
+    await handler(scope, receive, send)
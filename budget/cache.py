@@ -0,0 +1,56 @@
+import time
+
+from django.core.cache import cache
+
+
+class VersionStamp:
+    """
+    Integer version kept in the shared cache.
+
+    Processes compare the stamp with the one their local copy was built from
+    to notice changes made elsewhere without querying the database. The
+    initial value is time based, so a lost cache key never brings back a
+    version some process has already seen.
+    """
+
+    def __init__(self, key: str):
+        self.key = 'version:{}'.format(key)
+
+    @staticmethod
+    def _initial() -> int:
+        return int(time.time() * 1000)
+
+    def get(self) -> int:
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, self._initial(), timeout=None)
+            version = cache.get(self.key)
+        return version
+
+    def bump(self) -> int:
+        try:
+            return cache.incr(self.key)
+        except ValueError:
+            version = self._initial()
+            cache.set(self.key, version, timeout=None)
+            return version
+
+    @classmethod
+    def bump_many(cls, stamps) -> None:
+        """bump() of several stamps, sent in one round trip when the cache is redis"""
+
+        stamps = list(stamps)
+        client = getattr(cache, 'client', None)
+        if not hasattr(client, 'get_client'):
+            for stamp in stamps:
+                stamp.bump()
+            return
+
+        # django_redis keeps integers unpickled, INCR works on them
+        initial = cls._initial()
+        pipe = client.get_client(write=True).pipeline(transaction=False)
+        for stamp in stamps:
+            key = cache.make_key(stamp.key)
+            pipe.set(key, initial, nx=True)
+            pipe.incr(key)
+        pipe.execute()
@@ -0,0 +1,25 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag of version stamps the representation is built from"""
+
+    return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def conditional_response(request, etag: str, get_response):
+    """
+    304 when If-None-Match of request matches etag, otherwise response of
+    get_response(). Body is never built for a matching request.
+    Clients have to revalidate every time, responses are per user.
+    """
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = get_response()
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
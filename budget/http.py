@@ -0,0 +1,49 @@
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=settings.HTTP_RETRY_TOTAL,
+        backoff_factor=settings.HTTP_RETRY_BACKOFF_FACTOR,
+        status_forcelist=settings.HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Keep-alive session shared by all delivery code of the current process.
+
+    Sockets must not be shared between forked processes, so the session is
+    created lazily and rebuilt when the pid changes (celery prefork, uwsgi).
+    """
+
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
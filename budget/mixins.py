@@ -1,10 +1,53 @@
+from django.core.cache import cache
 from django.db import IntegrityError
 
+from budget.cache import VersionStamp
+
 
 class SingleInstanceMixin:
+    """
+    Model with at most one row.
+
+    get_instance() serves the row from a per-process copy, falling back to
+    the shared cache and only then to the database. Both copies are tied to
+    a version stamp that is bumped whenever the row is saved or deleted,
+    concrete models connect invalidate_instance to their post_save and
+    post_delete (see common.models).
+    """
+
+    _local_instances = {}
+    shared_cache_timeout = 60 * 60 * 24
 
     def save(self, *args, **kwargs):
         model = self.__class__
-        if (model.objects.count() > 0 and self.pk != model.objects.get().pk):
+        if model.objects.exclude(pk=self.pk).exists():
             raise IntegrityError('Can only create 1 %s instance' % model.__name__)
-        super(SingleInstanceMixin, self).save(*args, **kwargs)
\ No newline at end of file
+        super(SingleInstanceMixin, self).save(*args, **kwargs)
+
+    @classmethod
+    def _version_stamp(cls) -> VersionStamp:
+        return VersionStamp('singleton:{}'.format(cls._meta.label_lower))
+
+    @classmethod
+    def get_instance(cls):
+        label = cls._meta.label_lower
+        version = cls._version_stamp().get()
+
+        local = SingleInstanceMixin._local_instances.get(label)
+        if local is not None and local[0] == version:
+            return local[1]
+
+        key = 'singleton:{}:{}'.format(label, version)
+        cached = cache.get(key)
+        if cached is None:
+            cached = (cls.objects.first(), )
+            cache.set(key, cached, timeout=cls.shared_cache_timeout)
+
+        SingleInstanceMixin._local_instances[label] = (version, cached[0])
+        return cached[0]
+
+    @classmethod
+    def invalidate_instance(cls) -> None:
+        SingleInstanceMixin._local_instances.pop(cls._meta.label_lower, None)
+        cls._version_stamp().bump()
+
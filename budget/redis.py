@@ -0,0 +1,56 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+def _build_pool() -> redis.ConnectionPool:
+    return redis.ConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        retry_on_timeout=settings.REDIS_RETRY_ON_TIMEOUT,
+    )
+
+
+def get_redis() -> redis.Redis:
+    """
+    Redis client for application data, built from settings.REDIS_URL on first use.
+
+    Client is backed by a bounded connection pool, so a request borrows an open
+    connection instead of connecting. Like budget.http session the client is
+    rebuilt when the pid changes, connections are never shared after fork.
+    """
+
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = redis.Redis(connection_pool=_build_pool())
+                _client_pid = pid
+    return _client
+
+
+@contextmanager
+def pipeline(transaction: bool = False):
+    """
+    Buffers commands and sends them in one round trip when the block exits
+    without an error. Call execute() inside the block to read the replies.
+    """
+
+    pipe = get_redis().pipeline(transaction=transaction)
+    try:
+        yield pipe
+        pipe.execute()
+    finally:
+        pipe.reset()
@@ -51,6 +51,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'user.middleware.UserRolesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -115,6 +116,10 @@ STATICFILES_DIRS = [
 
 AUTH_USER_MODEL = 'user.User'
 
+AUTHENTICATION_BACKENDS = [
+    'user.backends.BitsetPermissionBackend',
+]
+
 LOGIN_URL = '/user/login/'
 CSRF_FAILURE_VIEW = 'budget.user.views.csrf_failure'
 
@@ -127,13 +132,24 @@ JWT_AUTH = {
     'JWT_PAYLOAD_GET_USERNAME_HANDLER': 'user.tools.jwt_get_username_from_payload_handler',
     'JWT_RESPONSE_PAYLOAD_HANDLER': 'user.tools.jwt_response_payload_handler',
     'JWT_GET_USER_SECRET_KEY': 'user.tools.jwt_get_user_secret_key',
+    'JWT_DECODE_HANDLER': 'user.tools.jwt_decode_handler',
     'JWT_AUTH_COOKIE': None
 }
 
+# Users resolved from JWT are kept in per-process LRU (see user.auth_cache)
+JWT_USER_CACHE_SIZE = 10000
+JWT_USER_CACHE_TTL = 60 * 5
+
+# Compiled email and push templates kept per process (see common.template_cache)
+TEMPLATE_CACHE_SIZE = 500
+
+# Role snapshots of users (see user.roles), invalidated by version on any change
+USER_ROLES_CACHE_TTL = 60 * 60
+
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'user.authentication.CachedJSONWebTokenAuthentication',
     ),
 
     'DEFAULT_PERMISSION_CLASSES': (
@@ -171,7 +187,25 @@ BROKER_TRANSPORT_OPTIONS = {'fanout_prefix': True, 'fanout_patterns': True}
 CELERY_STORE_ERRORS_EVEN_IF_IGNORED = False
 
 
+# Token obtain buffers last_login, flush_last_login task writes it (see user.last_login)
+# LAST_LOGIN_BUFFER is 'redis' or 'memory' (single process only)
+LAST_LOGIN_BUFFER = 'redis'
+LAST_LOGIN_FLUSH_INTERVAL = 60
+LAST_LOGIN_FLUSH_BATCH_SIZE = 1000
+
 CELERYBEAT_SCHEDULE = {
+    'flush_last_login': {
+        'task': 'user.tasks.flush_last_login',
+        'schedule': timedelta(seconds=LAST_LOGIN_FLUSH_INTERVAL),
+    },
+    'prune_notifications': {
+        'task': 'user.tasks.prune_notifications',
+        'schedule': crontab(minute=30, hour=3),
+    },
+    'prune_stale_firebase_tokens': {
+        'task': 'user.tasks.prune_stale_firebase_tokens',
+        'schedule': crontab(minute=0, hour=4),
+    },
     'update_fias_addrs_from_dbf': {
         'task': 'fias.tasks.update_fias_addrs_from_dbf',
         'schedule': crontab(minute=0, hour=0, day_of_week=[1, 2, 3, 4, 5]),
@@ -182,6 +216,31 @@ CELERYBEAT_SCHEDULE = {
 # http://docs.python-requests.org/en/master/user/advanced/#timeouts
 REQUEST_TIMEOUT_SECONDS = 30
 
+# Keep-alive pool used by delivery tasks (see budget.http)
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 20
+HTTP_RETRY_TOTAL = 3
+HTTP_RETRY_BACKOFF_FACTOR = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Connection pool of application redis client (see budget.redis), REDIS_URL is set per environment
+REDIS_MAX_CONNECTIONS = 50
+REDIS_SOCKET_TIMEOUT = 5
+REDIS_SOCKET_CONNECT_TIMEOUT = 2
+REDIS_RETRY_ON_TIMEOUT = True
+
+# Async delivery engine (see user.delivery)
+# When enabled bulk email/push batches are sent by deliver_batch tasks,
+# DELIVERY_JOBS_PER_TASK batches per task running concurrently
+DELIVERY_ASYNC = False
+DELIVERY_JOBS_PER_TASK = 50
+DELIVERY_CONCURRENCY = 200
+# Requests per second for each provider
+DELIVERY_RATE_LIMITS = {
+    'email': 50,
+    'push': 200,
+}
+
 
 NOTIFICATION_EVENT_CODES = (
     ('password_reset', 'password_reset'),
@@ -211,6 +270,8 @@ MAILGUN_DOMAIN = ''
 MAILGUN_API_URL = ''
 EMAIL_NOREPLY = 'noreply@budget.pro'
 EMAIL_JOB = 'job@budget.pro'
+# Mailgun accepts up to 1000 recipients per batch sending request
+MAILGUN_BATCH_SIZE = 1000
 
 # FireBase
 PUSH_TEMPLATES_DIR = os.path.join(BASE_DIR.parent, 'user', 'push_templates')
@@ -219,6 +280,28 @@ PUSH_NOTIFICATION_EVENT_CODES = (
     ('new_message', 'new_message'),
 )
 
+# Rows per INSERT in Notification.objects.bulk_notify
+NOTIFICATION_BATCH_SIZE = 1000
+
+# Live notifications stream (see user.streams), seconds between keepalive comments
+# and number of undelivered events kept per connection
+NOTIFICATION_STREAM_KEEPALIVE = 15
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+
+# Notifications older than NOTIFICATION_RETENTION_DAYS are deleted (or archived) nightly
+# by NOTIFICATION_RETENTION_BATCH_SIZE rows per transaction (see user.retention)
+NOTIFICATION_RETENTION_DAYS = 180
+NOTIFICATION_RETENTION_BATCH_SIZE = 5000
+NOTIFICATION_RETENTION_ARCHIVE = False
+
+# Password reset code checks allowed per email within the window, seconds (see user.reset_attempts)
+PASSWORD_RESET_MAX_ATTEMPTS = 5
+PASSWORD_RESET_ATTEMPTS_WINDOW = 15 * 60
+
 FIREBASE_URL_REQUEST = 'https://fcm.googleapis.com/fcm/send'
 FIREBASE_KEY_SERVER = ''
+# FCM legacy endpoint accepts up to 1000 registration_ids per request
+FIREBASE_BATCH_SIZE = 1000
+# FCM treats devices inactive for 270 days as stale, their tokens are dropped after that
+FIREBASE_TOKEN_TTL_DAYS = 270
 
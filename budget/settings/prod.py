@@ -36,6 +36,16 @@ REDIS_URL = 'redis://redis'
 BROKER_URL = '{}/{}'.format(REDIS_URL, '0')
 CELERY_RESULT_BACKEND = '{}/{}'.format(REDIS_URL, '0')
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': '{}/{}'.format(REDIS_URL, '1'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
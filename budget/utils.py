@@ -0,0 +1,13 @@
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split iterable into lists of at most size items"""
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -1,8 +1,6 @@
 import logging
 from datetime import datetime
 
-from django.contrib.auth.models import update_last_login
-
 from rest_framework import status
 from rest_framework.response import Response
 
@@ -17,6 +15,8 @@ from rest_framework_jwt.views import (
     jwt_response_payload_handler
 )
 
+from user.last_login import record_login
+
 log = logging.getLogger('app')
 
 
@@ -31,7 +31,7 @@ class ObtainJSONWebToken(JSONWebTokenAPIView):
         if serializer.is_valid():
             user = serializer.object.get('user') or request.user
             token = serializer.object.get('token')
-            update_last_login(None, user)
+            record_login(user)
             response_data = jwt_response_payload_handler(token, user, request)
             response = Response(response_data)
             if api_settings.JWT_AUTH_COOKIE:
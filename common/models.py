@@ -2,10 +2,13 @@ import os
 
 from django.conf import settings
 from django.db import models
-from django.template import Template
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 from budget.mixins import SingleInstanceMixin
+from common.registry import TemplateRegistry
+from common.template_cache import template_cache
 
 
 class Configuration(SingleInstanceMixin, models.Model):
@@ -24,8 +27,7 @@ class Configuration(SingleInstanceMixin, models.Model):
 
     @staticmethod
     def get_settings():
-        conf = Configuration.objects.all()
-        return conf[0] if conf else None
+        return Configuration.get_instance()
 
     @staticmethod
     def init_settings():
@@ -60,6 +62,8 @@ class EmailTemplate(models.Model):
 
     lang = models.CharField(choices=settings.LANGUAGES, max_length=2, default=settings.LANGUAGE_CODE)
 
+    template_fields = ('subj', 'text', 'html')
+
     class Meta:
         verbose_name = _('Шаблоны писем')
         verbose_name_plural = _('Шаблоны писем')
@@ -71,6 +75,7 @@ class EmailTemplate(models.Model):
     @staticmethod
     def reset_defaults():
         EmailTemplate.objects.all().delete()
+        template_cache.invalidate(EmailTemplate)
         for (event, descr) in settings.NOTIFICATION_EVENT_CODES:
             for lang in [lang[0] for lang in settings.LANGUAGES]:
                 dpath = os.path.join(
@@ -117,8 +122,8 @@ class EmailTemplate(models.Model):
     def format(self, context):
 
         emparts = []
-        for attr in ('subj', 'text', 'html'):
-            template = Template(getattr(self, attr))
+        for attr in self.template_fields:
+            template = template_cache.get(self, attr)
             emparts.append(template.render(context))
 
         return emparts
@@ -134,7 +139,7 @@ class ConfigurationFireBase(SingleInstanceMixin, models.Model):
 
     @staticmethod
     def get_settings():
-        return ConfigurationFireBase.objects.first()
+        return ConfigurationFireBase.get_instance()
 
     @staticmethod
     def init_settings():
@@ -161,6 +166,8 @@ class PushTemplate(models.Model):
     text = models.TextField(blank=False)
     lang = models.CharField(choices=settings.LANGUAGES, max_length=2, default=settings.LANGUAGE_CODE)
 
+    template_fields = ('title', 'text')
+
     class Meta:
         verbose_name = _('Шаблоны push уведомлений')
         verbose_name_plural = _('Шаблоны push уведомлений')
@@ -172,6 +179,7 @@ class PushTemplate(models.Model):
     @staticmethod
     def reset_defaults():
         PushTemplate.objects.all().delete()
+        template_cache.invalidate(PushTemplate)
         for (event, descr) in settings.PUSH_NOTIFICATION_EVENT_CODES:
             for lang in [lang[0] for lang in settings.LANGUAGES]:
                 dpath = os.path.join(
@@ -212,8 +220,40 @@ class PushTemplate(models.Model):
     def format(self, context):
 
         emparts = []
-        for attr in ('title', 'text'):
-            template = Template(getattr(self, attr))
+        for attr in self.template_fields:
+            template = template_cache.get(self, attr)
             emparts.append(template.render(context))
 
         return emparts
+
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_save, sender=PushTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+@receiver(post_delete, sender=PushTemplate)
+def invalidate_compiled_templates(sender, instance, **kwargs):
+    template_cache.invalidate(sender, instance.pk)
+
+
+email_templates = TemplateRegistry(EmailTemplate, 'email_templates')
+push_templates = TemplateRegistry(PushTemplate, 'push_templates')
+
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+def invalidate_email_templates(sender, **kwargs):
+    email_templates.invalidate()
+
+
+@receiver(post_save, sender=PushTemplate)
+@receiver(post_delete, sender=PushTemplate)
+def invalidate_push_templates(sender, **kwargs):
+    push_templates.invalidate()
+
+
+@receiver(post_save, sender=Configuration)
+@receiver(post_save, sender=ConfigurationFireBase)
+@receiver(post_delete, sender=Configuration)
+@receiver(post_delete, sender=ConfigurationFireBase)
+def invalidate_single_instance(sender, **kwargs):
+    sender.invalidate_instance()
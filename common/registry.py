@@ -0,0 +1,40 @@
+import threading
+
+from budget.cache import VersionStamp
+
+
+class TemplateRegistry:
+    """
+    In-memory map of (event, lang) -> template instance for one template model.
+
+    All rows are loaded with a single query and served from memory until the
+    shared version stamp changes, which happens on every save or delete of
+    the model in any process.
+    """
+
+    def __init__(self, model, key: str):
+        self.model = model
+        self.version = VersionStamp(key)
+        self._templates = {}
+        self._loaded_version = None
+        self._lock = threading.Lock()
+
+    def _load(self, version: int) -> None:
+        templates = {(tmpl.event, tmpl.lang): tmpl for tmpl in self.model.objects.all()}
+        with self._lock:
+            self._templates = templates
+            self._loaded_version = version
+
+    def snapshot(self) -> dict:
+        version = self.version.get()
+        if version != self._loaded_version:
+            self._load(version)
+        return self._templates
+
+    def get(self, event: str, lang: str):
+        return self.snapshot().get((event, lang))
+
+    def invalidate(self) -> None:
+        self.version.bump()
+        self._loaded_version = None
+
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template import Template
+
+
+class CompiledTemplateCache:
+    """
+    Process-wide bounded LRU of compiled django templates built from model fields.
+
+    Entries are keyed by (model label, pk, field, content hash), so an edited
+    template never reuses a stale compiled copy, in this or any other process,
+    and superseded entries are pushed out of the LRU.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _make_key(instance, field: str, source: str) -> tuple:
+        digest = hashlib.md5(source.encode()).hexdigest()
+        return instance._meta.label_lower, instance.pk, field, digest
+
+    def get(self, instance, field: str) -> Template:
+        source = getattr(instance, field)
+        key = self._make_key(instance, field, source)
+
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+
+        template = Template(source)
+        with self._lock:
+            self.misses += 1
+            self._templates[key] = template
+            while len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+        return template
+
+    def invalidate(self, model, pk=None) -> None:
+        label = model._meta.label_lower
+        with self._lock:
+            for key in list(self._templates):
+                if key[0] == label and (pk is None or key[1] == pk):
+                    del self._templates[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self._templates),
+        )
+
+
+template_cache = CompiledTemplateCache(settings.TEMPLATE_CACHE_SIZE)
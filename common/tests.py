@@ -1,3 +1,167 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import IntegrityError
+from django.template import Context
+from django.test import TestCase, override_settings
+
+from budget import http, redis
+from common.models import Configuration, EmailTemplate, PushTemplate, push_templates
+from common.template_cache import CompiledTemplateCache, template_cache
+
+
+class TemplateCacheTestCase(TestCase):
+
+    def setUp(self):
+        template_cache.clear()
+        self.tmpl = PushTemplate.objects.create(
+            event='new_message',
+            title='Hello {{ url }}',
+            text='At {{ datetime }}',
+            lang='ru',
+        )
+
+    def test_format_reuses_compiled_templates(self):
+        context = Context({'url': 1, 'datetime': 'now'})
+
+        self.assertEqual(self.tmpl.format(context), ['Hello 1', 'At now'])
+        self.assertEqual(self.tmpl.format(context), ['Hello 1', 'At now'])
+
+        stats = template_cache.stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hits'], 2)
+
+    def test_save_invalidates(self):
+        context = Context({'url': 1, 'datetime': 'now'})
+        self.tmpl.format(context)
+
+        self.tmpl.title = 'Bye {{ url }}'
+        self.tmpl.save()
+
+        self.assertEqual(template_cache.stats()['size'], 0)
+        self.assertEqual(self.tmpl.format(context), ['Bye 1', 'At now'])
+
+    def test_reset_defaults_invalidates(self):
+        EmailTemplate.reset_defaults()
+        tmpl = EmailTemplate.objects.get(event='invite', lang='ru')
+        tmpl.format(Context({}))
+
+        EmailTemplate.reset_defaults()
+
+        self.assertEqual(template_cache.stats()['size'], 0)
+
+    def test_size_is_bounded(self):
+        cache = CompiledTemplateCache(maxsize=1)
+        cache.get(self.tmpl, 'title')
+        cache.get(self.tmpl, 'text')
+
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_edit_is_seen_by_other_processes(self):
+        other = CompiledTemplateCache(maxsize=10)
+        context = Context({'url': 1, 'datetime': 'now'})
+        self.assertEqual(other.get(self.tmpl, 'title').render(context), 'Hello 1')
+
+        self.tmpl.title = 'Bye {{ url }}'
+        self.tmpl.save()
+
+        self.assertEqual(other.get(self.tmpl, 'title').render(context), 'Bye 1')
+
+
+class TemplateRegistryTestCase(TestCase):
+
+    def setUp(self):
+        PushTemplate.reset_defaults()
+
+    def test_lookups_are_served_from_memory(self):
+        push_templates.get('new_message', 'ru')
+
+        with self.assertNumQueries(0):
+            tmpl = push_templates.get('new_message', 'ru')
+            missing = push_templates.get('new_message', 'de')
+
+        self.assertEqual(tmpl.lang, 'ru')
+        self.assertIsNone(missing)
+
+    def test_save_reloads_registry(self):
+        tmpl = push_templates.get('new_message', 'en')
+        tmpl.title = 'Changed'
+        tmpl.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(push_templates.get('new_message', 'en').title, 'Changed')
+
+
+class SingleInstanceTestCase(TestCase):
+
+    def setUp(self):
+        Configuration.init_settings()
+
+    def test_get_settings_is_cached(self):
+        Configuration.get_settings()
+
+        with self.assertNumQueries(0):
+            conf = Configuration.get_settings()
+
+        self.assertEqual(conf.email_noreply, settings.EMAIL_NOREPLY)
+
+    def test_save_invalidates(self):
+        conf = Configuration.get_settings()
+        conf.email_noreply = 'changed@budget.pro'
+        conf.save()
+
+        self.assertEqual(Configuration.get_settings().email_noreply, 'changed@budget.pro')
+
+    def test_only_single_instance_models_invalidate(self):
+        with mock.patch.object(Configuration, 'invalidate_instance') as invalidate:
+            PushTemplate.objects.create(event='new_message', title='t', text='t', lang='ru')
+            invalidate.assert_not_called()
+
+            Configuration.get_settings().delete()
+            invalidate.assert_called_once_with()
+
+    def test_second_instance_is_rejected(self):
+        with self.assertRaises(IntegrityError):
+            Configuration.objects.create(mailgun_domain='other')
+
+
+class HttpSessionTestCase(TestCase):
+
+    def test_session_retries_posts(self):
+        retry = http._build_session().get_adapter('https://fcm.googleapis.com').max_retries
+
+        self.assertEqual(retry.total, settings.HTTP_RETRY_TOTAL)
+        self.assertIn('POST', retry.allowed_methods)
+
+
+class RedisClientTestCase(TestCase):
+
+    @override_settings(REDIS_URL='redis://redis:6379/3', REDIS_MAX_CONNECTIONS=7, REDIS_SOCKET_TIMEOUT=1)
+    def test_pool_is_built_from_settings(self):
+        pool = redis._build_pool()
+
+        self.assertEqual(pool.max_connections, 7)
+        self.assertEqual(pool.connection_kwargs['host'], 'redis')
+        self.assertEqual(pool.connection_kwargs['db'], 3)
+        self.assertEqual(pool.connection_kwargs['socket_timeout'], 1)
+
+    def test_client_is_rebuilt_after_fork(self):
+        client = redis.get_redis()
+        self.assertIs(redis.get_redis(), client)
+
+        with mock.patch('budget.redis.os.getpid', return_value=-1):
+            self.assertIsNot(redis.get_redis(), client)
+
+    def test_pipeline_is_executed_on_exit(self):
+        with redis.pipeline() as pipe:
+            pipe.set('redis-test', 1)
+            pipe.incr('redis-test')
+            self.assertIsNone(redis.get_redis().get('redis-test'))
+        self.assertEqual(redis.get_redis().get('redis-test'), b'2')
+
+        with self.assertRaises(ZeroDivisionError):
+            with redis.pipeline() as pipe:
+                pipe.set('redis-test', 3)
+                1 / 0
+        self.assertEqual(redis.get_redis().get('redis-test'), b'2')
+        redis.get_redis().delete('redis-test')
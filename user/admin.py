@@ -13,12 +13,13 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('is_superuser', 'is_staff', 'is_active', 'groups')
     search_fields = ('id', 'email', 'first_name', 'last_name')
     filter_horizontal = ('groups', 'user_permissions',)
+    raw_id_fields = ('parent',)
     list_per_page = 15
 
     add_form = UserForm
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
-        (_('Personal info'), {'fields': ('first_name', 'last_name', 'phone_number')}),
+        (_('Personal info'), {'fields': ('first_name', 'last_name', 'phone_number', 'parent')}),
         (_('Permissions'), {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups')}),
     )
     add_fieldsets = (
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_jwt.settings import api_settings
+
+from budget.cache import VersionStamp
+
+
+class AuthUserCache:
+    """
+    Bounded LRU with ttl of users resolved from JWT payloads.
+
+    Entry keeps a snapshot of the user row (AUTH_FIELDS) and the derived per-user
+    jwt secret. Entry is valid while the user's version stamp in the shared cache
+    is unchanged, the stamp is bumped whenever user row is changed in any process.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version(user_id) -> VersionStamp:
+        return VersionStamp('auth_user:{}'.format(user_id))
+
+    @staticmethod
+    def _fields() -> tuple:
+        """AUTH_FIELDS in model order, as Model.from_db expects them"""
+
+        # user.models imports this module
+        from user.models import AUTH_FIELDS
+
+        return tuple(
+            field.attname for field in get_user_model()._meta.concrete_fields
+            if field.attname in AUTH_FIELDS
+        )
+
+    def _build_user(self, values: tuple):
+        return get_user_model().from_db('default', self._fields(), values)
+
+    def _load(self, user_id, version: int) -> tuple:
+        User = get_user_model()
+        values = User.objects.filter(pk=user_id).values_list(*self._fields()).first()
+        if values is None:
+            raise User.DoesNotExist()
+
+        secret = api_settings.JWT_SECRET_KEY
+        if api_settings.JWT_GET_USER_SECRET_KEY:
+            secret = str(api_settings.JWT_GET_USER_SECRET_KEY(self._build_user(values)))
+        return values, secret, version, time.monotonic() + self.ttl
+
+    def resolve(self, user_id) -> tuple:
+        """
+        Returns new user instance and jwt secret for user_id.
+        Raises User.DoesNotExist.
+        """
+
+        version = self._version(user_id).get()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+
+        if entry is None or entry[2] != version or entry[3] < time.monotonic():
+            entry = self._load(user_id, version)
+            with self._lock:
+                self._entries[user_id] = entry
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return self._build_user(entry[0]), entry[1]
+
+    def get_version(self, user_id) -> int:
+        """Version of the user row, changes on every write of it in any process"""
+
+        return self._version(user_id).get()
+
+    def invalidate(self, *user_ids) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        VersionStamp.bump_many(self._version(user_id) for user_id in user_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+auth_user_cache = AuthUserCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.utils.translation import ugettext as _
+from rest_framework import exceptions
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication, jwt_get_username_from_payload
+
+from user.auth_cache import auth_user_cache
+
+
+class CachedJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """JWT authentication resolving users through user.auth_cache instead of a query per request"""
+
+    def authenticate_credentials(self, payload):
+        User = get_user_model()
+        username = jwt_get_username_from_payload(payload)
+
+        if not username:
+            msg = _('Invalid payload.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        try:
+            user = auth_user_cache.resolve(payload.get('user_id'))[0]
+        except User.DoesNotExist:
+            msg = _('Invalid signature.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        if user.get_username() != username:
+            msg = _('Invalid signature.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        if not user.is_active:
+            msg = _('User account is disabled.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        return user
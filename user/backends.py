@@ -0,0 +1,56 @@
+"""
+Permission backend on precomputed bitsets (see user.bitsets), has_perm is
+a bit test after one lookup of user's groups per user instance. The bitsets
+snapshot is taken with them, so further checks make no cache round trips.
+"""
+from django.contrib.auth.backends import ModelBackend
+
+from user.bitsets import load_user_bits, permission_bitsets
+
+
+class BitsetPermissionBackend(ModelBackend):
+    """ModelBackend answering permission checks from permission_bitsets"""
+
+    def _get_bits(self, user_obj) -> tuple:
+        """(direct, group, bitsets snapshot) of user, looked up once per user instance"""
+
+        if not hasattr(user_obj, '_perm_bits'):
+            data = permission_bitsets.get()
+            group_ids, direct = load_user_bits(user_obj)
+            user_obj._perm_bits = direct, permission_bitsets.group_mask(group_ids, data), data
+        return user_obj._perm_bits
+
+    def _get_names(self, user_obj, obj, mask_index=None) -> set:
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if user_obj.is_superuser:
+            return set(permission_bitsets.get()['bits'])
+
+        direct, group, data = self._get_bits(user_obj)
+        mask = (direct, group)[mask_index] if mask_index is not None else direct | group
+        return permission_bitsets.names(mask, data)
+
+    def get_user_permissions(self, user_obj, obj=None):
+        return self._get_names(user_obj, obj, 0)
+
+    def get_group_permissions(self, user_obj, obj=None):
+        return self._get_names(user_obj, obj, 1)
+
+    def get_all_permissions(self, user_obj, obj=None):
+        return self._get_names(user_obj, obj)
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return False
+        if user_obj.is_superuser:
+            return True
+
+        direct, group, data = self._get_bits(user_obj)
+        bit = permission_bitsets.bit(perm, data)
+        if bit is None:
+            return False
+        return bool((direct | group) >> bit & 1)
+
+    def has_module_perms(self, user_obj, app_label):
+        prefix = app_label + '.'
+        return any(name.startswith(prefix) for name in self.get_all_permissions(user_obj))
@@ -0,0 +1,109 @@
+"""
+Permissions as bitsets, permission pk is its bit number.
+
+Names of all permissions and the bitset of every group are built with three
+queries and kept in the shared cache and in memory of each process under a
+global version, bumped on any change of groups or permissions (see receivers
+in user.models). Permissions of a user are then one lookup of his group ids
+and direct permission ids (load_user_bits).
+"""
+import threading
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db.models import CharField, Value
+
+from budget.cache import VersionStamp
+
+
+class PermissionBitsets:
+
+    shared_cache_timeout = 60 * 60 * 24
+
+    def __init__(self, key: str):
+        self.key = key
+        self.version = VersionStamp(key)
+        self._data = None
+        self._loaded_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build() -> dict:
+        names = {
+            pk: '{}.{}'.format(app_label, codename)
+            for pk, app_label, codename in Permission.objects.values_list('pk', 'content_type__app_label', 'codename')
+        }
+        groups = {pk: [name, 0] for pk, name in Group.objects.values_list('pk', 'name')}
+        for group_id, permission_id in Group.permissions.through.objects.values_list('group_id', 'permission_id'):
+            groups[group_id][1] |= 1 << permission_id
+
+        return dict(
+            names=names,
+            bits={name: pk for pk, name in names.items()},
+            groups={pk: tuple(group) for pk, group in groups.items()},
+        )
+
+    def get(self) -> dict:
+        version = self.version.get()
+        if version == self._loaded_version:
+            return self._data
+
+        key = '{}:{}'.format(self.key, version)
+        data = cache.get(key)
+        if data is None:
+            data = self._build()
+            cache.set(key, data, timeout=self.shared_cache_timeout)
+        with self._lock:
+            self._data = data
+            self._loaded_version = version
+        return data
+
+    def invalidate(self) -> None:
+        self.version.bump()
+        with self._lock:
+            self._loaded_version = None
+
+    # Lookups below read the version once per call, pass data=get() to
+    # answer many of them from one snapshot
+
+    def bit(self, perm: str, data: dict = None):
+        return (data or self.get())['bits'].get(perm)
+
+    def names(self, mask: int, data: dict = None) -> set:
+        return {name for pk, name in (data or self.get())['names'].items() if mask >> pk & 1}
+
+    def group_names(self, group_ids, data: dict = None) -> set:
+        groups = (data or self.get())['groups']
+        return {groups[pk][0] for pk in group_ids if pk in groups}
+
+    def group_mask(self, group_ids, data: dict = None) -> int:
+        groups = (data or self.get())['groups']
+        mask = 0
+        for pk in group_ids:
+            if pk in groups:
+                mask |= groups[pk][1]
+        return mask
+
+
+permission_bitsets = PermissionBitsets('permission_bitsets')
+
+
+def load_user_bits(user) -> tuple:
+    """(group ids, bitset of direct permissions) of user with one query"""
+
+    User = type(user)
+    groups = User.groups.through.objects.filter(user_id=user.pk).annotate(
+        kind=Value('group', output_field=CharField())
+    ).values_list('kind', 'group_id')
+    permissions = User.user_permissions.through.objects.filter(user_id=user.pk).annotate(
+        kind=Value('permission', output_field=CharField())
+    ).values_list('kind', 'permission_id')
+
+    group_ids = []
+    mask = 0
+    for kind, pk in groups.union(permissions, all=True):
+        if kind == 'group':
+            group_ids.append(pk)
+        else:
+            mask |= 1 << pk
+    return tuple(group_ids), mask
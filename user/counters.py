@@ -0,0 +1,120 @@
+"""
+Unread notification counters kept in redis.
+
+Counter is incremented when notification is created and reset when user reads
+notifications list, so polling for new notifications never touches the database.
+Time of the last read is kept next to the counter to rebuild counters from the
+database (rebuild_unread_counters command).
+
+Version of user's notifications is bumped whenever the list changes, it is a
+part of the ETag of notifications list.
+"""
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from budget.redis import get_redis, pipeline
+from budget.utils import chunked
+
+UNREAD_KEY = 'notifications:unread:{}'
+READ_AT_KEY = 'notifications:read_at:{}'
+VERSION_KEY = 'notifications:version:{}'
+# users per query of rebuild, each adds a term to the WHERE clause
+REBUILD_BATCH_SIZE = 200
+
+
+def _initial_version() -> int:
+    # time based like budget.cache.VersionStamp, lost key never repeats a seen version
+    return int(time.time() * 1000)
+
+
+def _bump_versions(pipe, user_ids) -> None:
+    initial = _initial_version()
+    for user_id in user_ids:
+        pipe.setnx(VERSION_KEY.format(user_id), initial)
+        pipe.incr(VERSION_KEY.format(user_id))
+
+
+def incr_unread(counts: dict) -> dict:
+    """counts maps user id to number of new notifications, returns new unread counts"""
+
+    with pipeline() as pipe:
+        for user_id, count in counts.items():
+            pipe.incrby(UNREAD_KEY.format(user_id), count)
+        _bump_versions(pipe, counts)
+        return dict(zip(counts, pipe.execute()))
+
+
+def discount_unread(notifications: list) -> None:
+    """
+    Take deleted notifications off the unread counters and bump versions of their users.
+    notifications are (user_id, created) pairs, only rows created after user's last read
+    are counted in the counter.
+    """
+
+    user_ids = list({user_id for user_id, _ in notifications})
+    read_at = dict(zip(user_ids, get_redis().mget([READ_AT_KEY.format(user_id) for user_id in user_ids])))
+    unread = Counter(
+        user_id for user_id, created in notifications
+        if read_at[user_id] is None or created.timestamp() > float(read_at[user_id])
+    )
+
+    with pipeline() as pipe:
+        for user_id, count in unread.items():
+            pipe.decrby(UNREAD_KEY.format(user_id), count)
+        _bump_versions(pipe, user_ids)
+        left = pipe.execute()[:len(unread)]
+
+    # counter was lost or rebuilt meanwhile
+    negative = [user_id for user_id, count in zip(unread, left) if count < 0]
+    if negative:
+        get_redis().mset({UNREAD_KEY.format(user_id): 0 for user_id in negative})
+
+
+def get_version(user_id: int) -> int:
+    key = VERSION_KEY.format(user_id)
+    version = get_redis().get(key)
+    if version is None:
+        get_redis().setnx(key, _initial_version())
+        version = get_redis().get(key)
+    return int(version)
+
+
+def get_unread(user_id: int) -> int:
+    return int(get_redis().get(UNREAD_KEY.format(user_id)) or 0)
+
+
+def mark_read(user_id: int) -> None:
+    with pipeline(transaction=True) as pipe:
+        pipe.set(UNREAD_KEY.format(user_id), 0)
+        pipe.set(READ_AT_KEY.format(user_id), timezone.now().timestamp())
+
+
+def rebuild(user_ids) -> int:
+    """
+    Recount unread notifications of users from the database, returns number of users.
+    REBUILD_BATCH_SIZE users are counted with one grouped query and written with one MSET.
+    """
+
+    from user.models import Notification
+
+    rebuilt = 0
+    for chunk in chunked(user_ids, REBUILD_BATCH_SIZE):
+        read_at = get_redis().mget([READ_AT_KEY.format(user_id) for user_id in chunk])
+
+        never_read = [user_id for user_id, timestamp in zip(chunk, read_at) if timestamp is None]
+        condition = Q(user_id__in=never_read)
+        for user_id, timestamp in zip(chunk, read_at):
+            if timestamp is not None:
+                condition |= Q(user_id=user_id, created__gt=datetime.fromtimestamp(float(timestamp), tz=timezone.utc))
+
+        counts = dict.fromkeys(chunk, 0)
+        counts.update(
+            Notification.objects.filter(condition).order_by().values_list('user_id').annotate(count=Count('id'))
+        )
+        get_redis().mset({UNREAD_KEY.format(user_id): count for user_id, count in counts.items()})
+        rebuilt += len(chunk)
+    return rebuilt
@@ -0,0 +1,146 @@
+"""
+Asyncio delivery engine for email and push jobs.
+
+One process keeps hundreds of provider requests in flight instead of
+blocking a prefork worker on each of them. Jobs are plain dicts, so they
+can travel through celery as json:
+
+    {'type': 'email', 'conf': {...}, 'recipients': {email: variables}, 'subject': ..., 'html': ...}
+    {'type': 'push', 'conf': {...}, 'tokens': [...], 'title': ..., 'message': ...}
+"""
+import asyncio
+import json
+import logging
+
+import aiohttp
+from django.conf import settings
+
+log = logging.getLogger('app')
+
+
+def email_job(conf: dict, recipients: dict, subject: str, html: str) -> dict:
+    return dict(type='email', conf=conf, recipients=recipients, subject=subject, html=html)
+
+
+def push_job(conf: dict, tokens: list, title: str, message: str) -> dict:
+    return dict(type='push', conf=conf, tokens=tokens, title=title, message=message)
+
+
+def _email_request(job: dict) -> tuple:
+    conf = job['conf']
+    data = [
+        ('from', conf['email_noreply']),
+        ('subject', job['subject']),
+        ('html', job['html']),
+        ('recipient-variables', json.dumps(job['recipients'])),
+        ('o:native-send', 'yes'),
+    ]
+    data.extend(('to', email) for email in job['recipients'])
+    return conf['mailgun_api_url'], dict(
+        data=data,
+        auth=aiohttp.BasicAuth('api', conf['mailgun_api_key']),
+    )
+
+
+def _push_request(job: dict) -> tuple:
+    conf = job['conf']
+    data = {
+        'notification': {
+            'title': job['title'],
+            'body': job['message'],
+            'sound': 'default'
+        },
+        'data': {
+            'title': job['title'],
+            'body': job['message'],
+        },
+        'registration_ids': job['tokens']
+    }
+    return conf['firebase_url_request'], dict(
+        data=json.dumps(data),
+        headers={
+            'content-type': 'application/json',
+            'authorization': 'key=' + conf['firebase_key_server'],
+        },
+    )
+
+
+REQUEST_BUILDERS = {
+    'email': _email_request,
+    'push': _push_request,
+}
+
+
+class RateLimiter:
+    """Spaces requests of one provider to at most rate per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = asyncio.get_event_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class DeliveryEngine:
+
+    def __init__(self, concurrency: int = None, rate_limits: dict = None,
+                 retries: int = None, backoff: float = None, timeout: float = None):
+        self.concurrency = concurrency or settings.DELIVERY_CONCURRENCY
+        self.rate_limits = rate_limits if rate_limits is not None else settings.DELIVERY_RATE_LIMITS
+        self.retries = retries if retries is not None else settings.HTTP_RETRY_TOTAL
+        self.backoff = backoff if backoff is not None else settings.HTTP_RETRY_BACKOFF_FACTOR
+        self.timeout = timeout or settings.REQUEST_TIMEOUT_SECONDS
+
+    async def _send(self, session, semaphore, limiters, job: dict) -> dict:
+        url, kwargs = REQUEST_BUILDERS[job['type']](job)
+        result = dict(type=job['type'], status=None, data=None, error=None)
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            await limiters[job['type']].wait()
+            async with semaphore:
+                try:
+                    async with session.post(url, **kwargs) as response:
+                        result['status'] = response.status
+                        result['data'] = await response.json(content_type=None)
+                        result['error'] = None
+                except ValueError:
+                    result['data'] = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    result['status'] = None
+                    result['error'] = repr(err)
+
+            if result['status'] is not None and result['status'] not in settings.HTTP_RETRY_STATUSES:
+                break
+
+        if result['status'] != 200:
+            log.error('Delivery of %s job failed: %s %s', job['type'], result['status'], result['error'])
+        return result
+
+    async def run(self, jobs: list) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limiters = {name: RateLimiter(self.rate_limits.get(name)) for name in REQUEST_BUILDERS}
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            return await asyncio.gather(*[
+                self._send(session, semaphore, limiters, job) for job in jobs
+            ])
+
+    def deliver(self, jobs: list) -> list:
+        """Run jobs to completion from synchronous code (celery task)"""
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run(jobs))
+        finally:
+            loop.close()
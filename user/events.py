@@ -0,0 +1,110 @@
+"""
+Live notification events.
+
+Every created notification is published to CHANNEL after commit. Each ASGI
+process keeps one subscriber thread (Dispatcher) which hands messages to the
+queues of clients connected to the notifications stream (see user.streams),
+so the number of redis connections does not grow with the number of clients.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from redis.exceptions import RedisError
+
+from budget.redis import get_redis
+
+log = logging.getLogger('app')
+
+CHANNEL = 'notifications:events'
+
+
+def notification_message(notification, unread: int) -> dict:
+    return dict(
+        id=notification.pk,
+        user_id=notification.user_id,
+        event=notification.event,
+        created=notification.created,
+        new_messages=unread,
+    )
+
+
+def publish(messages: list) -> None:
+    try:
+        get_redis().publish(CHANNEL, json.dumps(messages, cls=DjangoJSONEncoder))
+    except RedisError:
+        log.exception('Notification events were not published')
+
+
+class Dispatcher:
+
+    poll_timeout = 1.0
+    reconnect_delay = 1.0
+
+    def __init__(self):
+        self._queues = defaultdict(set)
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Must be called from the event loop of the stream"""
+
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._loop is not loop:
+                self._loop = loop
+                self._thread = threading.Thread(
+                    target=self._listen, args=(loop, ), name='notification-events', daemon=True
+                )
+                self._thread.start()
+
+        queue = asyncio.Queue(maxsize=settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+        self._queues[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._queues.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._queues[user_id]
+
+    def dispatch(self, messages: list) -> None:
+        """Runs in the event loop"""
+
+        for message in messages:
+            for queue in self._queues.get(message['user_id'], ()):
+                if queue.full():
+                    # slow client, it gets the current unread count with the next message
+                    continue
+                queue.put_nowait(message)
+
+    def _listen(self, loop) -> None:
+        """Runs until loop is closed, a new loop gets a new thread"""
+
+        while not loop.is_closed():
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(CHANNEL)
+                while not loop.is_closed():
+                    # polling with timeout, blocking read would hit socket_timeout of the pool
+                    message = pubsub.get_message(timeout=self.poll_timeout)
+                    if message is not None:
+                        loop.call_soon_threadsafe(self.dispatch, json.loads(message['data']))
+            except RedisError:
+                log.exception('Notification events subscription is lost')
+                time.sleep(self.reconnect_delay)
+            except RuntimeError:
+                # loop was closed between the check and the call
+                return
+            finally:
+                pubsub.close()
+
+
+dispatcher = Dispatcher()
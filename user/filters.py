@@ -0,0 +1,36 @@
+from rest_framework.filters import BaseFilterBackend
+
+from user import hierarchy
+
+
+class HierarchyPermissionFilterBackend(BaseFilterBackend):
+    """
+    Narrows user list to the objects view permissions would allow one by one.
+
+    Scope of every ScopedPermission of the view (see user.permissions) becomes
+    one join on the closure table, so the page is selected by the database
+    instead of checking has_object_permission on each row. Detail routes are
+    left to has_object_permission, out of scope object stays 403, not 404.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        user = request.user
+
+        if getattr(view, 'detail', False) or user.is_superuser:
+            return queryset
+
+        for permission in view.get_permissions():
+            if not hasattr(permission, 'get_scope'):
+                continue
+
+            scope = permission.get_scope(request, view)
+            if scope is None:
+                return queryset.none()
+
+            min_depth, max_depth = scope
+            if max_depth == 0:
+                queryset = queryset.filter(pk=user.pk)
+            else:
+                queryset = queryset.filter(hierarchy.descendants_filter(user, max_depth, include_self=min_depth == 0))
+
+        return queryset
@@ -0,0 +1,139 @@
+"""
+Closure table of the user tree (User.parent).
+
+UserHierarchy keeps a row for every ancestor/descendant pair with the distance
+between them, including (user, user, 0). Any ancestry question is one lookup of
+the (ancestor, descendant) unique index, and subtree of a user is a join on it.
+Rows are maintained by signal receivers of User (see user.models), on create,
+reparent and delete. QuerySet.bulk_create and update() send no signals, users
+created by bulk_create need insert_bulk(), parent changed by update() needs
+rebuild() (manage.py rebuild_user_hierarchy).
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from budget.utils import chunked
+
+
+def _model():
+    # user.models imports this module
+    from user.models import UserHierarchy
+
+    return UserHierarchy
+
+
+def is_ancestor(ancestor, descendant, max_depth: int = None) -> bool:
+    """ancestor is parent (max_depth=1), grandparent (2) ... of descendant"""
+
+    links = _model().objects.filter(ancestor=ancestor, descendant=descendant, depth__gte=1)
+    if max_depth is not None:
+        links = links.filter(depth__lte=max_depth)
+    return links.exists()
+
+
+def descendants_filter(user, max_depth: int = None, include_self: bool = False) -> Q:
+    """Condition on User queryset selecting subtree of user"""
+
+    condition = Q(ancestor_links__ancestor=user)
+    if not include_self:
+        condition &= Q(ancestor_links__depth__gte=1)
+    if max_depth is not None:
+        condition &= Q(ancestor_links__depth__lte=max_depth)
+    return condition
+
+
+def get_parent_id(user):
+    return _model().objects.filter(descendant=user, depth=1).values_list('ancestor_id', flat=True).first()
+
+
+def _attach(user_id: int, parent_id: int) -> None:
+    """Link subtree of user under parent, user must be a root"""
+
+    UserHierarchy = _model()
+    ancestors = list(UserHierarchy.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+    subtree = list(UserHierarchy.objects.filter(ancestor_id=user_id).values_list('descendant_id', 'depth'))
+    UserHierarchy.objects.bulk_create([
+        UserHierarchy(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+        for ancestor_id, up in ancestors
+        for descendant_id, down in subtree
+    ])
+
+
+def detach(user) -> None:
+    """Make user a root keeping its subtree, used on reparent and delete"""
+
+    UserHierarchy = _model()
+    subtree = UserHierarchy.objects.filter(ancestor=user).values('descendant_id')
+    ancestors = UserHierarchy.objects.filter(descendant=user, depth__gte=1).values('ancestor_id')
+    UserHierarchy.objects.filter(descendant_id__in=subtree, ancestor_id__in=ancestors).delete()
+
+
+def insert(user) -> None:
+    """Rows of just created user"""
+
+    with transaction.atomic():
+        _model().objects.create(ancestor=user, descendant=user, depth=0)
+        if user.parent_id is not None:
+            _attach(user.pk, user.parent_id)
+
+
+def insert_bulk(users) -> None:
+    """Rows of users just created by bulk_create, users is a queryset selecting them"""
+
+    UserHierarchy = _model()
+    users = list(users.values_list('pk', 'parent_id'))
+    with transaction.atomic():
+        UserHierarchy.objects.bulk_create(
+            (UserHierarchy(ancestor_id=pk, descendant_id=pk, depth=0) for pk, _ in users),
+            batch_size=5000,
+        )
+        # _attach links whole subtree, so order of users with parents among them does not matter
+        for pk, parent_id in users:
+            if parent_id is not None:
+                _attach(pk, parent_id)
+
+
+def move(user) -> None:
+    """Bring rows in line with user.parent_id after save, no-op when parent is the same"""
+
+    if get_parent_id(user) == user.parent_id:
+        return
+    with transaction.atomic():
+        detach(user)
+        if user.parent_id is not None:
+            _attach(user.pk, user.parent_id)
+
+
+def check_parent(user) -> None:
+    """Raises ValueError when user.parent is user itself or one of its descendants"""
+
+    if user.pk is None or user.parent_id is None:
+        return
+    if _model().objects.filter(ancestor=user, descendant_id=user.parent_id).exists():
+        raise ValueError('User {} can not be a child of its own subtree'.format(user.pk))
+
+
+def rebuild(batch_size: int = 5000) -> int:
+    """Recreate all rows from User.parent, returns number of rows"""
+
+    from user.models import User
+
+    UserHierarchy = _model()
+    parents = dict(User.objects.values_list('pk', 'parent_id'))
+
+    def rows():
+        for user_id in parents:
+            ancestor_id, depth = user_id, 0
+            seen = set()
+            while ancestor_id is not None and ancestor_id not in seen:
+                seen.add(ancestor_id)
+                yield UserHierarchy(ancestor_id=ancestor_id, descendant_id=user_id, depth=depth)
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    count = 0
+    with transaction.atomic():
+        UserHierarchy.objects.all().delete()
+        for chunk in chunked(rows(), batch_size):
+            UserHierarchy.objects.bulk_create(chunk)
+            count += len(chunk)
+    return count
@@ -0,0 +1,85 @@
+"""
+Deferred last_login updates.
+
+Token obtain only records the login time in a buffer, flush_last_login task
+writes all buffered times with one bulk UPDATE every LAST_LOGIN_FLUSH_INTERVAL.
+"""
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from budget.redis import get_redis, pipeline
+from user.auth_cache import auth_user_cache
+
+
+class RedisLastLoginBuffer:
+    """Buffer shared by all processes, hash of user id -> login timestamp"""
+
+    key = 'last_login:pending'
+
+    def record(self, user_id: int, timestamp: float) -> None:
+        get_redis().hset(self.key, user_id, timestamp)
+
+    def drain(self) -> dict:
+        with pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.key)
+            pipe.delete(self.key)
+            pending, _ = pipe.execute()
+        return {int(user_id): float(timestamp) for user_id, timestamp in pending.items()}
+
+
+class MemoryLastLoginBuffer:
+    """Buffer of the current process only, for development and tests"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_id: int, timestamp: float) -> None:
+        with self._lock:
+            self._pending[user_id] = timestamp
+
+    def drain(self) -> dict:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+BUFFERS = {
+    'redis': RedisLastLoginBuffer(),
+    'memory': MemoryLastLoginBuffer(),
+}
+
+
+def get_buffer():
+    return BUFFERS[settings.LAST_LOGIN_BUFFER]
+
+
+def record_login(user) -> None:
+    """Replacement of django.contrib.auth.models.update_last_login without the UPDATE"""
+
+    user.last_login = timezone.now()
+    get_buffer().record(user.pk, user.last_login.timestamp())
+
+
+def flush() -> int:
+    """Write buffered login times, returns number of updated users"""
+
+    pending = get_buffer().drain()
+    if not pending:
+        return 0
+
+    User = get_user_model()
+    now = timezone.now()
+    users = [
+        User(pk=user_id, last_login=datetime.fromtimestamp(timestamp, tz=timezone.utc), updated=now)
+        for user_id, timestamp in pending.items()
+    ]
+    # bulk_update skips auto_now
+    User.objects.bulk_update(users, ['last_login', 'updated'], batch_size=settings.LAST_LOGIN_FLUSH_BATCH_SIZE)
+    # bulk_update sends no post_save, cached auth users are dropped here
+    auth_user_cache.invalidate(*pending)
+    return len(users)
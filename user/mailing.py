@@ -0,0 +1,117 @@
+import re
+
+from django.template import Context, TemplateSyntaxError
+from django.template.base import Variable, VariableNode
+from django.template.defaulttags import IfNode
+from django.utils.html import escape
+
+from common.template_cache import template_cache
+
+RECIPIENT_VARIABLE_RE = re.compile(r'%recipient\.(\w+)%')
+
+
+class RecipientPlaceholder:
+    """
+    Template variable rendered as Mailgun %recipient.<name>% placeholder.
+
+    Lookups on the placeholder produce nested placeholders, so
+    {{ user.first_name }} renders as %recipient.user_first_name%.
+    Every rendered name is recorded in used, to know which values
+    must be sent with recipient-variables.
+
+    Placeholder is substituted only as plain {{ user.field }} output, filters
+    and {% if %} would act on the placeholder text instead of the value, so
+    templates using them are rejected (see check_placeholders).
+    """
+
+    def __init__(self, name: str, used: set):
+        self.name = name
+        self.used = used
+
+    def __getitem__(self, key):
+        return RecipientPlaceholder('{}_{}'.format(self.name, key), self.used)
+
+    def __str__(self):
+        self.used.add(self.name)
+        return '%recipient.{}%'.format(self.name)
+
+
+def _is_placeholder(expression, names: set) -> bool:
+    return isinstance(expression.var, Variable) and expression.var.lookups[0] in names
+
+
+def _condition_expressions(condition):
+    """Variables of {% if %} condition, the tree of smartif operators and literals"""
+
+    if condition is None:
+        return
+    if condition.id == 'literal':
+        yield condition.value
+    yield from _condition_expressions(condition.first)
+    yield from _condition_expressions(condition.second)
+
+
+def check_placeholders(template, names: set) -> None:
+    """Raises TemplateSyntaxError when variables in names are used with filters or in {% if %}"""
+
+    for node in template.nodelist.get_nodes_by_type(VariableNode):
+        if node.filter_expression.filters and _is_placeholder(node.filter_expression, names):
+            raise TemplateSyntaxError(
+                'Recipient variable "{}" can not be used with filters'.format(node.filter_expression.token)
+            )
+    for node in template.nodelist.get_nodes_by_type(IfNode):
+        for condition, _ in node.conditions_nodelists:
+            for expression in _condition_expressions(condition):
+                if _is_placeholder(expression, names):
+                    raise TemplateSyntaxError(
+                        'Recipient variable "{}" can not be used in if'.format(expression.token)
+                    )
+
+
+def render_for_recipients(tmpl, context: dict, recipient_context: dict) -> tuple:
+    """
+    Render template once for a whole batch.
+    Returns rendered parts and the set of placeholder names used by them.
+    """
+
+    names = set(recipient_context)
+    if 'user' not in context:
+        names.add('user')
+    for field in tmpl.template_fields:
+        check_placeholders(template_cache.get(tmpl, field), names)
+
+    used = set()
+    context = dict(context)
+    for name in names:
+        context[name] = RecipientPlaceholder(name, used)
+
+    return tmpl.format(Context(context)), used
+
+
+def get_recipient_variables(user, used: set, recipient_context: dict) -> dict:
+    """
+    Values of placeholders in used for one recipient. They are put into the html
+    after autoescape has run (by Mailgun or substitute), so they are escaped here.
+    Raises TemplateSyntaxError for a name neither in recipient_context nor an
+    attribute of user.
+    """
+
+    variables = {}
+    for name in used:
+        if name in recipient_context:
+            value = recipient_context[name](user)
+        elif name == 'user':
+            value = user
+        elif name.startswith('user_') and hasattr(user, name[len('user_'):]):
+            value = getattr(user, name[len('user_'):])
+            if callable(value):
+                value = value()
+        else:
+            # nested lookup like {{ user.parent.email }} or {{ url_sign_up.x }}
+            raise TemplateSyntaxError('Unknown recipient variable "{}"'.format(name))
+        variables[name] = escape(value)
+    return variables
+
+
+def substitute(text: str, variables: dict) -> str:
+    return RECIPIENT_VARIABLE_RE.sub(lambda m: variables.get(m.group(1), ''), text)
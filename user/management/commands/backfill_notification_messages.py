@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from common.models import push_templates
+from user.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Store rendered messages in notifications created before they were stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        templates = push_templates.snapshot()
+        notifications = Notification.objects.filter(title__isnull=True).only('pk', 'event', 'created').order_by('pk')
+
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(notifications.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            rendered = []
+            for notification in batch:
+                message = notification.render_message(templates)
+                if message is not None:
+                    notification.title, notification.body = message
+                    rendered.append(notification)
+            Notification.objects.bulk_update(rendered, ['title', 'body'])
+            updated += len(rendered)
+
+        self.stdout.write('Stored messages of {} notifications'.format(updated))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare SQL of the user lookup done on every authenticated request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email='bench-auth@budget.local',
+                password='bench-auth',
+                first_name='Bench',
+                last_name='Auth',
+                description='x' * 4096,
+            )
+
+            lookups = (
+                ('annotated (old default)', lambda: User.objects.with_full_name().get(email=user.email)),
+                ('auth profile', lambda: User.objects.get_by_natural_key(user.email)),
+            )
+            for label, lookup in lookups:
+                with CaptureQueriesContext(connection) as ctx:
+                    lookup()
+                sql = ctx.captured_queries[0]['sql']
+
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    lookup()
+                elapsed = (time.perf_counter() - start) * 1000 / iterations
+
+                self.stdout.write('{}: {} queries, {} bytes of SQL, {:.3f} ms per lookup'.format(
+                    label, len(ctx.captured_queries), len(sql), elapsed
+                ))
+                self.stdout.write('    {}'.format(sql))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from budget.redis import get_redis
+from budget.utils import chunked
+from user import counters, hierarchy
+from user.models import Notification, User
+
+
+class Command(BaseCommand):
+    help = 'Measure Notification.objects.bulk_notify throughput, all rows are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--with-push', action='store_true', help='also queue push deliveries')
+
+    def handle(self, *args, **options):
+        for recipients in options['recipients']:
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    (
+                        User(
+                            email='bench-notify-{}@budget.local'.format(i),
+                            first_name='Bench',
+                            last_name='Notify',
+                            password='!',
+                        )
+                        for i in range(recipients)
+                    ),
+                )
+                users = User.objects.filter(email__startswith='bench-notify-')
+                hierarchy.insert_bulk(users)
+
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    count = Notification.objects.bulk_notify(users, 'new_message', push=options['with_push'])
+                    elapsed = time.perf_counter() - start
+
+                self.stdout.write('{} recipients: {} notifications in {:.2f} s, {:.0f} per second, {} queries'.format(
+                    recipients, count, elapsed, count / elapsed, len(ctx.captured_queries)
+                ))
+
+                user_ids = list(users.values_list('pk', flat=True))
+                transaction.set_rollback(True)
+
+            for chunk in chunked(user_ids, 1000):
+                get_redis().delete(*[counters.UNREAD_KEY.format(user_id) for user_id in chunk])
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user import retention
+
+
+class Command(BaseCommand):
+    help = 'Delete or archive notifications older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_RETENTION_BATCH_SIZE)
+        parser.add_argument('--archive', action='store_true', default=settings.NOTIFICATION_RETENTION_ARCHIVE,
+                            help='move rows to the archive table instead of deleting them')
+
+    def handle(self, *args, **options):
+        pruned = retention.prune(options['days'], options['batch_size'], options['archive'])
+        self.stdout.write('{} {} notifications older than {} days'.format(
+            'Archived' if options['archive'] else 'Deleted', pruned, options['days']
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from budget.utils import chunked
+from user import counters
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuild redis unread notification counters from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='user id, may be repeated')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = options['users'] or User.objects.values_list('pk', flat=True).iterator()
+
+        rebuilt = 0
+        for chunk in chunked(user_ids, options['batch_size']):
+            rebuilt += counters.rebuild(chunk)
+
+        self.stdout.write('Rebuilt counters of {} users'.format(rebuilt))
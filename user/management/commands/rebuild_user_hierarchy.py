@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from user import hierarchy
+
+
+class Command(BaseCommand):
+    help = 'Recreate closure table of the user tree from User.parent'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rows = hierarchy.rebuild(options['batch_size'])
+        self.stdout.write('Created {} hierarchy rows'.format(rows))
@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from user.roles import get_roles
+
+
+class UserRolesMiddleware:
+    """
+    Sets request.user_roles, role snapshot (user.roles) of the request's user.
+    It is lazy: DRF authenticates JWT in the view and sets request.user before
+    permissions are checked, the snapshot is built on first access after that.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_roles = SimpleLazyObject(lambda: get_roles(request.user))
+        return self.get_response(request)
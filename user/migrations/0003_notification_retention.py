@@ -0,0 +1,46 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_notification_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField()),
+                ('created', models.DateTimeField(verbose_name='Дата и время создания')),
+                ('event', models.CharField(choices=[('new_message', 'new_message')], max_length=255)),
+                ('archived', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время архивации')),
+            ],
+            options={
+                'verbose_name': 'Архивное уведомление',
+                'verbose_name_plural': 'Архивные уведомления',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='notification',
+            options={'verbose_name': 'Уведомление', 'verbose_name_plural': 'Уведомления'},
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created'], name='notification_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notificationarchive',
+            index=models.Index(fields=['user', '-created'], name='notification_archive_user_idx'),
+        ),
+    ]
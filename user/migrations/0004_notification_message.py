@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_notification_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='body',
+            field=models.TextField(blank=True, null=True, verbose_name='Текст'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='title',
+            field=models.TextField(blank=True, null=True, verbose_name='Заголовок'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='body',
+            field=models.TextField(blank=True, null=True, verbose_name='Текст'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='title',
+            field=models.TextField(blank=True, null=True, verbose_name='Заголовок'),
+        ),
+    ]
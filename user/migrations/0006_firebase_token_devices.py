@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def delete_duplicate_tokens(apps, schema_editor):
+    """Device used by several accounts keeps only the latest registration"""
+
+    FirebaseToken = apps.get_model('user', 'FirebaseToken')
+    duplicates = (
+        FirebaseToken.objects.values('token')
+        .annotate(latest=models.Max('pk'), count=models.Count('pk'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        FirebaseToken.objects.filter(token=row['token']).exclude(pk=row['latest']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_user_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='firebasetoken',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата и время активности'),
+        ),
+        migrations.RunPython(delete_duplicate_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='firebasetoken',
+            name='token',
+            field=models.CharField(max_length=2048, unique=True, verbose_name='Токен'),
+        ),
+        migrations.AlterField(
+            model_name='firebasetoken',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='firebase_tokens', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
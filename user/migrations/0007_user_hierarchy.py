@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_self_links(apps, schema_editor):
+    """Existing users have no parent yet, each of them is a root of its own tree"""
+
+    User = apps.get_model('user', 'User')
+    UserHierarchy = apps.get_model('user', 'UserHierarchy')
+    UserHierarchy.objects.bulk_create(
+        UserHierarchy(ancestor_id=pk, descendant_id=pk, depth=0)
+        for pk in User.objects.values_list('pk', flat=True).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0006_firebase_token_devices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to=settings.AUTH_USER_MODEL, verbose_name='Руководитель'),
+        ),
+        migrations.CreateModel(
+            name='UserHierarchy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Связь иерархии пользователей',
+                'verbose_name_plural': 'Иерархия пользователей',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userhierarchy',
+            index=models.Index(fields=['descendant', 'depth'], name='user_hierarchy_descendant_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userhierarchy',
+            unique_together={('ancestor', 'descendant')},
+        ),
+        migrations.RunPython(create_self_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0007_user_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='passwordresetdata',
+            name='hash_str',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -2,6 +2,7 @@ import logging
 import random
 import string
 import uuid
+from collections import Counter
 from datetime import timedelta
 from typing import Union
 
@@ -9,25 +10,76 @@ from django.conf import settings
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
+    Group,
+    Permission,
     PermissionsMixin,
 )
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
 from django.db.models.functions import Concat
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
 from django.template import Context
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.utils.translation import gettext_lazy as _
 from phonenumber_field.modelfields import PhoneNumberField
 
-from common.models import Configuration, EmailTemplate, PushTemplate, ConfigurationFireBase
+from budget.utils import chunked
+from common.models import (
+    Configuration,
+    ConfigurationFireBase,
+    EmailTemplate,
+    PushTemplate,
+    email_templates,
+    push_templates,
+)
+from user import counters, events, hierarchy, roles
+from user.auth_cache import auth_user_cache
+from user.bitsets import permission_bitsets
+from user.delivery import email_job, push_job
 from user.errors import SingUpExpiredError
+from user.mailing import get_recipient_variables, render_for_recipients
+from user.tasks import deliver_batch as celery_deliver_batch
 from user.tasks import send_message as celery_send_mail
-from user.tasks import send_push as celery_send_push
+from user.tasks import send_message_batch as celery_send_mail_batch
+from user.tasks import send_push_batch as celery_send_push_batch
 
 log = logging.getLogger('app')
 
 
-class CustomUserManager(BaseUserManager):
+# Fields loaded on the authentication path, enough for login, JWT and self info
+AUTH_FIELDS = (
+    'id',
+    'password',
+    'last_login',
+    'is_superuser',
+    'is_staff',
+    'is_active',
+    'email',
+    'first_name',
+    'last_name',
+    'date_joined',
+    'phone_number',
+    'updated',
+)
+
+
+class UserQuerySet(models.QuerySet):
+
+    def with_full_name(self):
+        return self.annotate(full_name_db=Concat('first_name', models.Value(' '), 'last_name'))
+
+    def for_auth(self):
+        return self.only(*AUTH_FIELDS)
+
+    def descendants_of(self, user, max_depth: int = None, include_self: bool = False):
+        """Users below user in the tree down to max_depth levels, one join on the closure table"""
+
+        return self.filter(hierarchy.descendants_filter(user, max_depth, include_self))
+
+
+class CustomUserManager(BaseUserManager.from_queryset(UserQuerySet)):
 
     def _create_user(self, email, password, **extra_fields):
         """
@@ -58,10 +110,109 @@ class CustomUserManager(BaseUserManager):
 
         return self._create_user(email, password, **extra_fields)
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        qs = qs.annotate(full_name=Concat('first_name', models.Value(' '), 'last_name'))
-        return qs
+    @staticmethod
+    def _enqueue_jobs(jobs) -> int:
+        """
+        Queue delivery jobs, one task per job or, with DELIVERY_ASYNC,
+        DELIVERY_JOBS_PER_TASK jobs per async deliver_batch task.
+        Returns number of queued jobs.
+        """
+
+        count = 0
+        if settings.DELIVERY_ASYNC:
+            for group in chunked(jobs, settings.DELIVERY_JOBS_PER_TASK):
+                celery_deliver_batch.delay(group)
+                count += len(group)
+            return count
+
+        for job in jobs:
+            if job['type'] == 'push':
+                celery_send_push_batch.delay(job['conf'], job['tokens'], job['title'], job['message'])
+            else:
+                celery_send_mail_batch.delay(job['conf'], job['recipients'], job['subject'], job['html'])
+            count += 1
+        return count
+
+    def send_push_bulk(self, queryset, event: str, context: dict, lang: str = 'ru') -> int:
+        """
+        Render push template once and send it to every device of users in queryset.
+        Tokens are grouped by FIREBASE_BATCH_SIZE, one celery task and one FCM request per group.
+        Returns number of batches.
+        """
+
+        tmpl = push_templates.get(event, lang)
+        if not tmpl:
+            return 0
+
+        title, text = tmpl.format(Context(context))
+        return self.push_bulk(queryset, title, text)
+
+    def push_bulk(self, queryset, title: str, text: str) -> int:
+        """Send rendered push to every device of users in queryset, returns number of batches"""
+
+        conf = ConfigurationFireBase.get_settings()
+        if not conf:
+            return 0
+
+        tokens = FirebaseToken.objects.for_users(queryset)
+
+        return self._enqueue_jobs(
+            push_job(conf.get_firebase_conf(), chunk, title, text)
+            for chunk in chunked(tokens.iterator(), settings.FIREBASE_BATCH_SIZE)
+        )
+
+    def send_email_bulk(self, queryset, event: str, context: dict = None, lang: str = 'ru',
+                        recipient_context: dict = None) -> int:
+        """
+        Render email template once with Mailgun %recipient.<name>% placeholders and send it
+        to users of queryset, MAILGUN_BATCH_SIZE recipients per celery task and API request.
+        {{ user.<attr> }} is filled from each recipient; recipient_context maps
+        other per-recipient variable names to callables taking the recipient.
+        Returns number of batches.
+        """
+
+        conf = Configuration.get_settings()
+        tmpl = email_templates.get(event, lang)
+        if not conf or not tmpl:
+            return 0
+
+        recipient_context = recipient_context or {}
+        (subj, text, html), used = render_for_recipients(tmpl, context or {}, recipient_context)
+
+        return self._enqueue_jobs(
+            email_job(
+                conf.get_smtp_conf(),
+                {
+                    recipient.email: get_recipient_variables(recipient, used, recipient_context)
+                    for recipient in chunk
+                },
+                subj,
+                html,
+            )
+            for chunk in chunked(queryset.iterator(), settings.MAILGUN_BATCH_SIZE)
+        )
+
+    def init_invite_bulk(self, queryset, user, lang: str = 'ru') -> int:
+        """Bulk version of User.init_invite, user is the one who invites"""
+
+        user_ids = list(queryset.values_list('pk', flat=True))
+        with transaction.atomic():
+            self.filter(pk__in=user_ids).update(is_active=False, updated=timezone.now())
+            UsersSingUp.objects.filter(user_id__in=user_ids).delete()
+            invites = UsersSingUp.objects.bulk_create(UsersSingUp(user_id=pk) for pk in user_ids)
+        auth_user_cache.invalidate(*user_ids)
+
+        tokens = {invite.user_id: invite.token for invite in invites}
+        return self.send_email_bulk(
+            self.filter(pk__in=user_ids),
+            'invite',
+            context={'user': user.get_full_name()},
+            lang=lang,
+            recipient_context={'url_sign_up': lambda recipient: tokens[recipient.pk]},
+        )
+
+    def get_by_natural_key(self, username):
+        return self.for_auth().get(**{self.model.USERNAME_FIELD: username})
 
 
 class AbstractUser(AbstractBaseUser, PermissionsMixin):
@@ -114,14 +265,33 @@ class AbstractUser(AbstractBaseUser, PermissionsMixin):
         self.email = self.__class__.objects.normalize_email(self.email)
 
 
+class PasswordResetDataManager(models.Manager):
+
+    def get_by_code(self, email: str, code: str) -> Union['PasswordResetData', None]:
+        """Active reset data of user with email together with the user, when code matches"""
+
+        try:
+            data = self.select_related('user').get(user__email=email, is_active=True)
+        except self.model.DoesNotExist:
+            return None
+        return data if constant_time_compare(data.code, code) else None
+
+    def get_active(self, hash_str: str) -> Union['PasswordResetData', None]:
+        """Active reset data by hash_str together with the user, one lookup of hash_str index"""
+
+        return self.select_related('user').filter(hash_str=hash_str, is_active=True).first()
+
+
 class PasswordResetData(models.Model):
 
     user = models.OneToOneField('user.User', on_delete=models.CASCADE, null=False)
     created = models.DateTimeField(auto_now_add=True)
-    hash_str = models.CharField(max_length=255, blank=False)
+    hash_str = models.CharField(max_length=255, blank=False, db_index=True)
     code = models.CharField(max_length=8, blank=False)
     is_active = models.BooleanField(_('Активный'), default=True)
 
+    objects = PasswordResetDataManager()
+
     def complete(self, password: str, lang: str = 'en'):
         self.is_active = False
         self.save()
@@ -141,6 +311,16 @@ class User(AbstractUser):
 
     description = models.TextField(_('description'), blank=True)
     phone_number = PhoneNumberField(blank=True)
+    # Version of the row for ETag of self info, bulk updates must set it explicitly
+    updated = models.DateTimeField(_('Дата и время изменения'), auto_now=True)
+    parent = models.ForeignKey(
+        'self',
+        verbose_name=_('Руководитель'),
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='children',
+    )
 
     class Meta:
         ordering = ['-id']
@@ -148,6 +328,21 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._track_parent()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        self._track_parent()
+
+    def _track_parent(self) -> None:
+        """Remember parent the hierarchy rows agree with, post_save skips them while it is the same"""
+        if 'parent_id' in self.__dict__:
+            self._hierarchy_parent_id = self.parent_id
+
     def send_email(self, subj, text, html):
         conf = Configuration.get_settings()
         if conf:
@@ -155,10 +350,7 @@ class User(AbstractUser):
 
     @staticmethod
     def _get_template(event: str, lang: str = 'en') -> Union[EmailTemplate, None]:
-        try:
-            return EmailTemplate.objects.get(event=event, lang=lang)
-        except EmailTemplate.DoesNotExist:
-            return None
+        return email_templates.get(event, lang)
 
     def _clear_reset_data(self) -> None:
         try:
@@ -188,7 +380,7 @@ class User(AbstractUser):
     def get_password_reset_hash(self, code: str) -> Union[str, None]:
         try:
             data = self.passwordresetdata
-            if data.code == code:
+            if constant_time_compare(data.code, code):
                 return data.hash_str
         except ObjectDoesNotExist:
             return
@@ -212,22 +404,23 @@ class User(AbstractUser):
             self.send_email(*mess_struct)
 
     def send_push(self, title, text):
+        """Send push to all devices of user with one FCM request"""
+
         conf = ConfigurationFireBase.get_settings()
-        if conf:
-            celery_send_push.delay(conf.get_firebase_conf(), self.firebasetoken.token, title, text)
+        if not conf:
+            return
+        tokens = list(FirebaseToken.objects.for_users([self.pk]))
+        if tokens:
+            celery_send_push_batch.delay(conf.get_firebase_conf(), tokens, title, text)
 
     @staticmethod
     def get_template_push(event: str, lang: str = 'ru') -> Union[PushTemplate, None]:
-        try:
-            return PushTemplate.objects.get(event=event, lang=lang)
-        except PushTemplate.DoesNotExist:
-            return None
+        return push_templates.get(event, lang)
 
     def init_push(self, tmp, mission_id, date_time, lang: str = 'ru'):
 
         tmpl = self.get_template_push(tmp, lang)
-        firebase_token = FirebaseToken.objects.filter(user=self)
-        if tmpl and firebase_token.exists():
+        if tmpl:
             context = Context({
                 'url': mission_id,
                 'datetime': date_time,
@@ -238,6 +431,32 @@ class User(AbstractUser):
     def get_full_name(self):
         return '{} {}'.format(self.last_name, self.first_name)
 
+    @property
+    def full_name(self) -> str:
+        """Annotated by User.objects.with_full_name() or computed, used in email templates"""
+        if 'full_name_db' in self.__dict__:
+            return self.full_name_db
+        return '{} {}'.format(self.first_name, self.last_name)
+
+
+class UserHierarchy(models.Model):
+    """Closure table of User.parent, maintained by user.hierarchy"""
+
+    ancestor = models.ForeignKey('user.User', on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey('user.User', on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = "Связь иерархии пользователей"
+        verbose_name_plural = "Иерархия пользователей"
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='user_hierarchy_descendant_idx'),
+        ]
+
+    def __str__(self):
+        return '%s -> %s (%s)' % (self.ancestor_id, self.descendant_id, self.depth)
+
 
 class UsersSingUp(models.Model):
     user = models.OneToOneField('user.User', on_delete=models.CASCADE)
@@ -267,10 +486,63 @@ class UsersSingUp(models.Model):
             raise SingUpExpiredError(_('Время действия токена автивации истекло'))
 
 
+class FirebaseTokenQuerySet(models.QuerySet):
+
+    def for_users(self, users):
+        """Tokens of all devices of users (queryset or ids) with one query"""
+
+        if isinstance(users, models.QuerySet):
+            users = users.values('pk')
+        return self.filter(user__in=users).values_list('token', flat=True)
+
+    def by_user(self, users) -> dict:
+        """Maps user id to the list of tokens of his devices"""
+
+        if isinstance(users, models.QuerySet):
+            users = users.values('pk')
+        tokens = {}
+        for user_id, token in self.filter(user__in=users).values_list('user_id', 'token'):
+            tokens.setdefault(user_id, []).append(token)
+        return tokens
+
+
+class FirebaseTokenManager(models.Manager.from_queryset(FirebaseTokenQuerySet)):
+
+    def register(self, user, token: str):
+        """
+        Token identifies a device, so it is moved to user when the device
+        was used by somebody else before. Seen time is refreshed on every call.
+        """
+
+        firebase_token, created = self.update_or_create(
+            token=token,
+            defaults={'user': user, 'last_seen': timezone.now()},
+        )
+        return firebase_token
+
+    def prune(self, tokens) -> int:
+        """Delete tokens FCM does not accept anymore, returns number of deleted"""
+
+        if not tokens:
+            return 0
+        deleted, _ = self.filter(token__in=tokens).delete()
+        return deleted
+
+    def prune_stale(self, days: int = None) -> int:
+        """Delete tokens of devices not seen for FIREBASE_TOKEN_TTL_DAYS"""
+
+        days = days if days is not None else settings.FIREBASE_TOKEN_TTL_DAYS
+        deleted, _ = self.filter(last_seen__lt=timezone.now() - timedelta(days=days)).delete()
+        return deleted
+
+
 class FirebaseToken(models.Model):
-    token = models.CharField(verbose_name=_('Токен'), max_length=2048)
+    token = models.CharField(verbose_name=_('Токен'), max_length=2048, unique=True)
     created = models.DateTimeField(verbose_name=_('Дата и время создания'), default=timezone.now)
-    user = models.OneToOneField('user.User', on_delete=models.CASCADE)
+    last_seen = models.DateTimeField(verbose_name=_('Дата и время активности'), default=timezone.now)
+    user = models.ForeignKey('user.User', on_delete=models.CASCADE, related_name='firebase_tokens')
+
+    objects = FirebaseTokenManager()
 
     class Meta:
         verbose_name = "Данные токена firebase"
@@ -280,15 +552,186 @@ class FirebaseToken(models.Model):
         return '%s) %s' % (self.id, self.user.email)
 
 
+def count_unread_on_commit(notifications: list) -> None:
+    """
+    Increment unread counters of new notifications and publish them to live streams
+    once they are committed, a rolled back row is neither counted nor announced.
+    """
+
+    def count_and_publish():
+        unread = counters.incr_unread(Counter(notification.user_id for notification in notifications))
+        events.publish([
+            events.notification_message(notification, unread[notification.user_id])
+            for notification in notifications
+        ])
+
+    transaction.on_commit(count_and_publish)
+
+
+class NotificationManager(models.Manager):
+
+    def bulk_notify(self, users, event: str, context: dict = None, lang: str = 'ru', push: bool = True) -> int:
+        """
+        Create notification of event for every user of users queryset,
+        NOTIFICATION_BATCH_SIZE rows per INSERT, with message rendered once
+        and stored in every row, publish them to live streams
+        and push the same message to their devices with batched deliveries.
+        Returns number of created notifications.
+        """
+
+        created = timezone.now()
+        message = self.model(event=event, created=created).render_message(lang=lang, context=context)
+        title, body = message or (None, None)
+
+        count = 0
+        user_ids = users.values_list('pk', flat=True).iterator()
+        for chunk in chunked(user_ids, settings.NOTIFICATION_BATCH_SIZE):
+            notifications = self.bulk_create([
+                self.model(user_id=user_id, event=event, created=created, title=title, body=body)
+                for user_id in chunk
+            ])
+            count_unread_on_commit(notifications)
+            count += len(chunk)
+
+        if push and count and message is not None:
+            # the same text as stored, rows share event and created
+            User.objects.push_bulk(users, title, body)
+        return count
+
+    def notify(self, user, event: str, context: dict = None, lang: str = 'ru', push: bool = True) -> int:
+        return self.bulk_notify(User.objects.filter(pk=user.pk), event, context, lang, push)
+
+
 class Notification(models.Model):
     created = models.DateTimeField(verbose_name=_('Дата и время создания'), default=timezone.now)
     user = models.ForeignKey('user.User', on_delete=models.CASCADE)
     event = models.CharField(max_length=255, choices=settings.PUSH_NOTIFICATION_EVENT_CODES)
+    # Push template rendered at creation time, null for rows created before
+    # (see backfill_notification_messages command)
+    title = models.TextField(verbose_name=_('Заголовок'), null=True, blank=True)
+    body = models.TextField(verbose_name=_('Текст'), null=True, blank=True)
+
+    objects = NotificationManager()
 
     class Meta:
         verbose_name = "Уведомление"
         verbose_name_plural = "Уведомления"
-        ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['user', '-created', '-id'], name='notification_user_created_idx'),
+            # retention (user.retention) scans old rows of all users
+            models.Index(fields=['created'], name='notification_created_idx'),
+        ]
 
     def __str__(self):
         return '%s) %s' % (self.id, self.user.email)
+
+    def render_message(self, templates: dict = None, lang: str = 'ru', context: dict = None) -> Union[tuple, None]:
+        """
+        Title and body of the push template of event, templates is
+        push_templates.snapshot() when many notifications are rendered.
+        """
+
+        if templates is None:
+            templates = push_templates.snapshot()
+        tmpl = templates.get((self.event, lang))
+        if tmpl is None:
+            return None
+
+        message_context = {
+            'url': getattr(self, 'mission_id', None),
+            'datetime': self.created,
+        }
+        message_context.update(context or {})
+        return tmpl.format(Context(message_context))
+
+
+class NotificationArchive(models.Model):
+    """Notifications moved out of Notification table by retention"""
+
+    notification_id = models.BigIntegerField()
+    created = models.DateTimeField(verbose_name=_('Дата и время создания'))
+    user = models.ForeignKey('user.User', on_delete=models.CASCADE, db_index=False)
+    event = models.CharField(max_length=255, choices=settings.PUSH_NOTIFICATION_EVENT_CODES)
+    title = models.TextField(verbose_name=_('Заголовок'), null=True, blank=True)
+    body = models.TextField(verbose_name=_('Текст'), null=True, blank=True)
+    archived = models.DateTimeField(verbose_name=_('Дата и время архивации'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Архивное уведомление"
+        verbose_name_plural = "Архивные уведомления"
+        indexes = [
+            models.Index(fields=['user', '-created'], name='notification_archive_user_idx'),
+        ]
+
+    def __str__(self):
+        return '%s) %s' % (self.notification_id, self.user_id)
+
+
+@receiver(pre_save, sender=User)
+def check_user_parent(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'parent' not in update_fields):
+        return
+    if getattr(instance, '_hierarchy_parent_id', models.DEFERRED) == instance.parent_id:
+        return
+    hierarchy.check_parent(instance)
+
+
+@receiver(post_save, sender=User)
+def update_user_hierarchy(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'parent' not in update_fields):
+        return
+    if created:
+        hierarchy.insert(instance)
+    elif getattr(instance, '_hierarchy_parent_id', models.DEFERRED) != instance.parent_id:
+        hierarchy.move(instance)
+    instance._track_parent()
+
+
+@receiver(pre_delete, sender=User)
+def detach_user_hierarchy(sender, instance, **kwargs):
+    # children are kept with their subtrees, parent is set to null
+    hierarchy.detach(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_user_cache(sender, instance, **kwargs):
+    auth_user_cache.invalidate(instance.pk)
+    # a process may have reloaded the row before the change was committed
+    transaction.on_commit(lambda: auth_user_cache.invalidate(instance.pk))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        roles.invalidate_users(instance.pk)
+    elif pk_set:
+        roles.invalidate_users(*pk_set)
+    else:
+        # group.user_set.clear() does not tell which users were removed
+        roles.invalidate_all()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        permission_bitsets.invalidate()
+        roles.invalidate_all()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permission_bitsets(sender, **kwargs):
+    permission_bitsets.invalidate()
+    roles.invalidate_all()
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created:
+        count_unread_on_commit([instance])
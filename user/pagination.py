@@ -0,0 +1,81 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination on (created, id), newest first.
+
+    Page is fetched with created < cursor or (created = cursor and id < cursor),
+    which is a range scan of (user, -created, -id) index, so deep pages cost
+    the same as the first one. Cursor is opaque to clients.
+
+    Unlike PageNumberPagination the response has no count and previous keys,
+    counting would scan the whole list.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'size'
+    max_page_size = 100
+    invalid_cursor_message = _('Invalid cursor')
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, obj) -> str:
+        position = json.dumps([obj.created.isoformat(), obj.pk])
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            created, pk = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            created = parse_datetime(created)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        queryset = queryset.order_by('-created', '-id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            created, pk = position
+            queryset = queryset.filter(Q(created__lt=created) | Q(created=created, id__lt=pk))
+
+        page = list(queryset[:self.page_size + 1])
+        self.next_cursor = self.encode_cursor(page[self.page_size - 1]) if len(page) > self.page_size else None
+        return page[:self.page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
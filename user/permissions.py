@@ -1,5 +1,69 @@
 from rest_framework import permissions
 
+from user import hierarchy
+from user.roles import for_request
+
+
+def is_above(user, obj, levels: int) -> bool:
+    """
+    user is parent of obj (levels=1), grandparent (2) or great-grandparent (3).
+    Parent is compared by id, higher levels cost one closure table lookup.
+    """
+
+    if obj.parent_id == user.pk:
+        return True
+    return levels > 1 and obj.parent_id is not None and hierarchy.is_ancestor(user, obj, levels)
+
+
+# Scope is (min_depth, max_depth) of objects below user, depth 0 is user himself:
+# (0, 0) only self, (1, 2) children and grandchildren, (0, 2) self and both.
+# Roles are tried in order, the first one user has decides the scope.
+ROLE_SCOPES = (
+    ('budget', (0, 0)),
+    ('brigadier', (1, 1)),
+    ('coordinator', (1, 2)),
+    ('candidate', (1, 3)),
+)
+DELETE_ROLE_SCOPES = ROLE_SCOPES[1:]
+
+
+def get_role_scope(roles, scopes: tuple = ROLE_SCOPES):
+    for role, scope in scopes:
+        if roles.in_groups([role]):
+            return scope
+    return None
+
+
+def in_scope(user, obj, scope: tuple) -> bool:
+    """Python side of the scope, the same rule as HierarchyPermissionFilterBackend applies in SQL"""
+
+    min_depth, max_depth = scope
+    if obj == user:
+        return min_depth == 0
+    return max_depth > 0 and is_above(user, obj, max_depth)
+
+
+class ScopedPermission(permissions.BasePermission):
+    """
+    Object permission decided by get_scope, so that object checks
+    and queryset filtering of lists share the same rules.
+    """
+
+    def get_scope(self, request, view):
+        """Scope of objects available to request.user, None if there is none"""
+
+        raise NotImplementedError('.get_scope() must be overridden.')
+
+    def has_object_permission(self, request, view, obj):
+
+        user = request.user
+
+        if user.is_superuser:
+            return True
+
+        scope = self.get_scope(request, view)
+        return scope is not None and in_scope(user, obj, scope)
+
 
 class RespondentViewSetPermission(permissions.BasePermission):
 
@@ -9,13 +73,15 @@ class RespondentViewSetPermission(permissions.BasePermission):
         if user.is_superuser:
             return True
 
+        roles = for_request(request)
+
         if view.action == 'create':
-            return user.groups.filter(name__in=['budget', 'brigadier', 'coordinator', 'candidate'])
+            return roles.in_groups(['budget', 'brigadier', 'coordinator', 'candidate'])
         else:
-            return user.groups.filter(name__in=['brigadier', 'coordinator', 'candidate'])
+            return roles.in_groups(['brigadier', 'coordinator', 'candidate'])
 
 
-class UserProfileSetPermission(permissions.BasePermission):
+class UserProfileSetPermission(ScopedPermission):
 
     def has_permission(self, request, view):
 
@@ -24,96 +90,69 @@ class UserProfileSetPermission(permissions.BasePermission):
         if user.is_superuser:
             return True
 
+        roles = for_request(request)
+
         if request.method in permissions.SAFE_METHODS:
-            return user.has_perms(['user.view_profile'])
+            return roles.has_perms(['user.view_profile'])
         else:
             if view.action in ('update', 'partial_update'):
-                return user.has_perm('user.change_profile')
+                return roles.has_perm('user.change_profile')
             else:
                 return False
 
-    def has_object_permission(self, request, view, obj):
-
-        user = request.user
+    def get_scope(self, request, view):
 
-        if user.is_superuser:
-            return True
+        roles = for_request(request)
 
-        if request.method in permissions.SAFE_METHODS and user.has_perm('user.view_profile'):
-            return obj == user
-        elif user.has_perms(['user.change_profile']):
-            return obj == user
+        if request.method in permissions.SAFE_METHODS and roles.has_perm('user.view_profile'):
+            return 0, 0
+        elif roles.has_perms(['user.change_profile']):
+            return 0, 0
         else:
-            return False
+            return None
 
 
-class BudgetViewSetPermission(permissions.BasePermission):
+class BudgetViewSetPermission(ScopedPermission):
 
     def has_permission(self, request, view):
         user = request.user
         if user.is_superuser:
             return True
 
+        roles = for_request(request)
+
         if request.method in permissions.SAFE_METHODS:
-            return user.has_perm('user.view_budget')
+            return roles.has_perm('user.view_budget')
         else:
             if view.action in ['create', 'invite_again']:
-                return user.has_perm('user.add_budget')
+                return roles.has_perm('user.add_budget')
             if view.action in ['set_firebase_token']:
-                return user.is_budget
+                return roles.is_budget
             elif view.action in ('update', 'partial_update'):
-                return user.has_perm('user.change_budget')
+                return roles.has_perm('user.change_budget')
             elif view.action == 'destroy':
-                return user.has_perm('core.delete_budget')
+                return roles.has_perm('core.delete_budget')
             else:
                 return False
 
-    def has_object_permission(self, request, view, obj):
+    def get_scope(self, request, view):
 
-        user = request.user
-
-        if user.is_superuser:
-            return True
+        roles = for_request(request)
 
         if view.action == 'set_firebase_token' and request.method == 'POST':
-            return obj == user
-
-        if request.method in permissions.SAFE_METHODS and user.has_perm('user.view_budget'):
-            if user.is_budget:
-                return obj == user
-            if user.is_brigadier:
-                return obj.parent == user
-            elif user.is_coordinator:
-                return obj.parent == user or obj.parent.parent == user
-            elif user.is_candidate:
-                return obj.parent == user or obj.parent.parent == user or obj.parent.parent.parent == user
-            else:
-                return False
-        elif user.has_perm('user.change_budget'):
-            if user.is_budget:
-                return obj == user
-            if user.is_brigadier:
-                return obj.parent == user
-            elif user.is_coordinator:
-                return obj.parent == user or obj.parent.parent == user
-            elif user.is_candidate:
-                return obj.parent == user or obj.parent.parent == user or obj.parent.parent.parent == user
-            else:
-                return False
-        elif user.has_perm('user.delete_budget'):
-            if user.is_brigadier:
-                return obj.parent == user
-            elif user.is_coordinator:
-                return obj.parent == user or obj.parent.parent == user
-            elif user.is_candidate:
-                return obj.parent == user or obj.parent.parent == user or obj.parent.parent.parent == user
-            else:
-                return False
+            return 0, 0
+
+        if request.method in permissions.SAFE_METHODS and roles.has_perm('user.view_budget'):
+            return get_role_scope(roles)
+        elif roles.has_perm('user.change_budget'):
+            return get_role_scope(roles)
+        elif roles.has_perm('user.delete_budget'):
+            return get_role_scope(roles, DELETE_ROLE_SCOPES)
         else:
-            return False
+            return None
 
 
-class BrigadierViewSetPermission(permissions.BasePermission):
+class BrigadierViewSetPermission(ScopedPermission):
 
     def has_permission(self, request, view):
 
@@ -122,37 +161,35 @@ class BrigadierViewSetPermission(permissions.BasePermission):
         if user.is_superuser:
             return True
 
+        roles = for_request(request)
+
         if request.method in permissions.SAFE_METHODS:
-            return user.has_perms(['user.view_brigadier'])
+            return roles.has_perms(['user.view_brigadier'])
         else:
             if view.action in ['create', 'invite_again']:
-                return user.has_perm('user.add_brigadier')
+                return roles.has_perm('user.add_brigadier')
             elif view.action in ('update', 'partial_update'):
-                return user.has_perm('user.change_brigadier')
+                return roles.has_perm('user.change_brigadier')
             elif view.action == 'destroy':
-                return user.has_perm('core.delete_brigadier')
+                return roles.has_perm('core.delete_brigadier')
             else:
                 return False
 
-    def has_object_permission(self, request, view, obj):
-
-        user = request.user
-
-        if user.is_superuser:
-            return True
+    def get_scope(self, request, view):
 
-        if request.method in permissions.SAFE_METHODS and user.has_perm('user.view_brigadier'):
-            return obj.parent == user or obj.parent.parent == user or obj == user
+        roles = for_request(request)
 
-        elif user.has_perms(['user.change_brigadier', 'user.delete_brigadier']):
-            return obj.parent == user or obj.parent.parent == user
-        elif user.has_perms(['user.change_brigadier']):
-            return obj == user
+        if request.method in permissions.SAFE_METHODS and roles.has_perm('user.view_brigadier'):
+            return 0, 2
+        elif roles.has_perms(['user.change_brigadier', 'user.delete_brigadier']):
+            return 1, 2
+        elif roles.has_perms(['user.change_brigadier']):
+            return 0, 0
         else:
-            return False
+            return None
 
 
-class CoordinatorViewSetPermission(permissions.BasePermission):
+class CoordinatorViewSetPermission(ScopedPermission):
 
     def has_permission(self, request, view):
 
@@ -161,39 +198,37 @@ class CoordinatorViewSetPermission(permissions.BasePermission):
         if user.is_superuser:
             return True
 
+        roles = for_request(request)
+
         if request.method in permissions.SAFE_METHODS:
-            return user.has_perms(['user.view_coordinator'])
+            return roles.has_perms(['user.view_coordinator'])
         else:
             if view.action in ['create', 'invite_again']:
-                return user.has_perm('user.add_coordinator')
+                return roles.has_perm('user.add_coordinator')
             elif view.action in ('update', 'partial_update'):
-                return user.has_perm('user.change_coordinator')
+                return roles.has_perm('user.change_coordinator')
             elif view.action == 'destroy':
-                return user.has_perm('user.delete_coordinator')
+                return roles.has_perm('user.delete_coordinator')
             else:
                 return False
 
-    def has_object_permission(self, request, view, obj):
-
-        user = request.user
-
-        if user.is_superuser:
-            return True
+    def get_scope(self, request, view):
 
-        if request.method in permissions.SAFE_METHODS and user.has_perm('user.view_coordinator'):
-            return obj.parent == user or obj == user
+        roles = for_request(request)
 
-        elif user.has_perm('user.add_coordinator'):
-            return obj.parent == user
-        elif user.has_perms(['user.change_coordinator', 'user.delete_coordinator']):
-            return obj.parent == user
-        elif user.has_perm('user.change_coordinator'):
-            return obj == user
+        if request.method in permissions.SAFE_METHODS and roles.has_perm('user.view_coordinator'):
+            return 0, 1
+        elif roles.has_perm('user.add_coordinator'):
+            return 1, 1
+        elif roles.has_perms(['user.change_coordinator', 'user.delete_coordinator']):
+            return 1, 1
+        elif roles.has_perm('user.change_coordinator'):
+            return 0, 0
         else:
-            return False
+            return None
 
 
-class CandidateViewSetPermission(permissions.BasePermission):
+class CandidateViewSetPermission(ScopedPermission):
 
     def has_permission(self, request, view):
 
@@ -202,26 +237,25 @@ class CandidateViewSetPermission(permissions.BasePermission):
         if user.is_superuser:
             return True
 
+        roles = for_request(request)
+
         if request.method in permissions.SAFE_METHODS:
             if view.action == 'list':
                 return False
-            return user.has_perms(['user.view_candidate'])
+            return roles.has_perms(['user.view_candidate'])
         else:
             if view.action in ('update', 'partial_update'):
-                return user.has_perm('user.change_candidate')
+                return roles.has_perm('user.change_candidate')
 
         return False
 
-    def has_object_permission(self, request, view, obj):
-
-        user = request.user
-
-        if user.is_superuser:
-            return True
+    def get_scope(self, request, view):
 
-        if request.method in permissions.SAFE_METHODS and user.has_perm('user.view_candidate'):
-            return obj == user
-        elif user.has_perm('user.change_candidate'):
-            return obj == user
+        roles = for_request(request)
 
-        return False
+        if request.method in permissions.SAFE_METHODS and roles.has_perm('user.view_candidate'):
+            return 0, 0
+        elif roles.has_perm('user.change_candidate'):
+            return 0, 0
+        else:
+            return None
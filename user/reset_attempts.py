@@ -0,0 +1,40 @@
+"""
+Password reset code checks counted per email in redis.
+
+Code has 10^8 values, so checks are limited: every check counts an attempt
+before the database is touched and after PASSWORD_RESET_MAX_ATTEMPTS within
+PASSWORD_RESET_ATTEMPTS_WINDOW seconds the email is rejected without a query
+until the window expires. Counter is dropped only when a code is accepted,
+issuing a new code keeps it, otherwise requesting codes would reset the limit.
+"""
+from typing import Union
+
+from django.conf import settings
+
+from budget.redis import get_redis, pipeline
+
+ATTEMPTS_KEY = 'password_reset:attempts:{}'
+
+
+def _key(email: str) -> str:
+    return ATTEMPTS_KEY.format(email.strip().lower())
+
+
+def hit(email: str) -> Union[int, None]:
+    """Counts an attempt, returns seconds to wait when the limit is exceeded, None otherwise"""
+
+    key = _key(email)
+    with pipeline() as pipe:
+        # window starts with the first attempt
+        pipe.set(key, 0, ex=settings.PASSWORD_RESET_ATTEMPTS_WINDOW, nx=True)
+        pipe.incr(key)
+        pipe.ttl(key)
+        _, attempts, ttl = pipe.execute()
+
+    if attempts > settings.PASSWORD_RESET_MAX_ATTEMPTS:
+        return max(ttl, 1)
+    return None
+
+
+def clear(email: str) -> None:
+    get_redis().delete(_key(email))
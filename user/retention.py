@@ -0,0 +1,63 @@
+"""
+Retention of notifications.
+
+Notifications older than NOTIFICATION_RETENTION_DAYS are deleted, or moved to
+NotificationArchive when NOTIFICATION_RETENTION_ARCHIVE is set, by
+prune_notifications task every night. Rows are processed in batches of
+NOTIFICATION_RETENTION_BATCH_SIZE primary keys, each batch in its own short
+transaction, so live inserts and reads are never blocked for long.
+Unread counters of the owners are decreased by the pruned unread rows.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from user import counters
+
+
+def get_cutoff(days: int = None):
+    return timezone.now() - timedelta(days=days if days is not None else settings.NOTIFICATION_RETENTION_DAYS)
+
+
+def prune_batch(before, batch_size: int, archive: bool) -> int:
+    """Delete or archive one batch of the oldest rows created before, returns number of rows"""
+
+    from user.models import Notification, NotificationArchive
+
+    with transaction.atomic():
+        rows = list(
+            Notification.objects.filter(created__lt=before)
+            .order_by('created')
+            .values_list('pk', 'created', 'user_id', 'event', 'title', 'body')[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        if archive:
+            NotificationArchive.objects.bulk_create([
+                NotificationArchive(
+                    notification_id=pk, created=created, user_id=user_id, event=event, title=title, body=body
+                )
+                for pk, created, user_id, event, title, body in rows
+            ])
+        Notification.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+    counters.discount_unread([(user_id, created) for _, created, user_id, *_ in rows])
+    return len(rows)
+
+
+def prune(days: int = None, batch_size: int = None, archive: bool = None) -> int:
+    """Returns number of pruned notifications"""
+
+    before = get_cutoff(days)
+    batch_size = batch_size or settings.NOTIFICATION_RETENTION_BATCH_SIZE
+    archive = settings.NOTIFICATION_RETENTION_ARCHIVE if archive is None else archive
+
+    total = 0
+    while True:
+        pruned = prune_batch(before, batch_size, archive)
+        total += pruned
+        if pruned < batch_size:
+            return total
@@ -0,0 +1,107 @@
+"""
+Roles and permissions of a user resolved once per request.
+
+RoleSnapshot holds group names and permission names of the user, it is built
+with one query from permission bitsets (user.bitsets) and kept in the shared
+cache under the user's role version.
+The version is bumped on any change of user's groups or permissions and the
+global one on changes of groups themselves (see receivers in user.models).
+
+Permission classes get the snapshot with for_request(request), the same
+object is available to views as request.user_roles (UserRolesMiddleware).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from budget.cache import VersionStamp
+from user.bitsets import load_user_bits, permission_bitsets
+
+ROLES = ('budget', 'brigadier', 'coordinator', 'candidate')
+
+
+class RoleSnapshot:
+
+    def __init__(self, user, groups: frozenset, permissions: frozenset):
+        self.user_id = user.pk
+        self.is_superuser = user.is_active and user.is_superuser
+        self.groups = groups
+        self.permissions = permissions
+
+    def __repr__(self):
+        return '<RoleSnapshot user={} groups={}>'.format(self.user_id, sorted(self.groups))
+
+    def in_groups(self, names) -> bool:
+        return not self.groups.isdisjoint(names)
+
+    def has_perm(self, perm: str) -> bool:
+        return self.is_superuser or perm in self.permissions
+
+    def has_perms(self, perms) -> bool:
+        return all(self.has_perm(perm) for perm in perms)
+
+    @property
+    def is_budget(self) -> bool:
+        return 'budget' in self.groups
+
+    @property
+    def is_brigadier(self) -> bool:
+        return 'brigadier' in self.groups
+
+    @property
+    def is_coordinator(self) -> bool:
+        return 'coordinator' in self.groups
+
+    @property
+    def is_candidate(self) -> bool:
+        return 'candidate' in self.groups
+
+
+def _global_version() -> VersionStamp:
+    return VersionStamp('roles')
+
+
+def _user_version(user_id) -> VersionStamp:
+    return VersionStamp('roles:{}'.format(user_id))
+
+
+def _load(user) -> tuple:
+    if not user.is_active:
+        return frozenset(), frozenset()
+
+    group_ids, direct = load_user_bits(user)
+    data = permission_bitsets.get()
+    groups = frozenset(permission_bitsets.group_names(group_ids, data))
+    permissions = frozenset(permission_bitsets.names(direct | permission_bitsets.group_mask(group_ids, data), data))
+    return groups, permissions
+
+
+def get_roles(user) -> RoleSnapshot:
+    if not user.is_authenticated:
+        return RoleSnapshot(user, frozenset(), frozenset())
+
+    key = 'user_roles:{}:{}:{}'.format(user.pk, _global_version().get(), _user_version(user.pk).get())
+    data = cache.get(key)
+    if data is None:
+        data = _load(user)
+        cache.set(key, data, timeout=settings.USER_ROLES_CACHE_TTL)
+    return RoleSnapshot(user, *data)
+
+
+def for_request(request) -> RoleSnapshot:
+    """request.user_roles, built on first call when UserRolesMiddleware is not installed"""
+
+    roles = getattr(request, 'user_roles', None)
+    if roles is None or roles.user_id != request.user.pk:
+        roles = get_roles(request.user)
+        # DRF request proxies attribute reads to the django one
+        setattr(getattr(request, '_request', request), 'user_roles', roles)
+    return roles
+
+
+def invalidate_users(*user_ids) -> None:
+    for user_id in user_ids:
+        _user_version(user_id).bump()
+
+
+def invalidate_all() -> None:
+    _global_version().bump()
@@ -4,8 +4,9 @@ from django.contrib.auth.models import Permission
 from django.contrib.auth.password_validation import validate_password as dj_validate_pasw
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
 
+from user import reset_attempts
 from user.models import PasswordResetData, User
 
 log = logging.getLogger('app')
@@ -50,21 +51,20 @@ class CheckCodeSerializer(serializers.Serializer):
     code = serializers.CharField(max_length=255, allow_blank=False, allow_null=False)
 
     def validate(self, attrs):
-        try:
-            user = User.objects.get(email=attrs.get('email'))
-        except User.DoesNotExist:
-            raise serializers.ValidationError(_('Invalid data presented'))
+        wait = reset_attempts.hit(attrs.get('email'))
+        if wait is not None:
+            raise exceptions.Throttled(wait)
 
-        hash_str = user.get_password_reset_hash(code=attrs.get('code'))
-        if hash_str is None:
+        reset_data = PasswordResetData.objects.get_by_code(attrs.get('email'), attrs.get('code'))
+        if reset_data is None:
             raise serializers.ValidationError(_('Invalid data presented'))
 
+        reset_attempts.clear(attrs.get('email'))
+        attrs['reset_data'] = reset_data
         return attrs
 
     def create(self, validated_data) -> str:
-        user = User.objects.get(email=validated_data.get('email'))
-        hash_str = user.get_password_reset_hash(code=validated_data.get('code'))
-        return hash_str
+        return validated_data['reset_data'].hash_str
 
     def update(self, instance, validated_data):
         raise ValueError(_('Method not allowed'))
@@ -82,23 +82,16 @@ class RecoverySetNewPassword(serializers.Serializer):
         except ValidationError as err:
             raise serializers.ValidationError(err)
 
-    def validate_hash(self, value):
-        try:
-            password_reset_data = PasswordResetData.objects.get(hash_str=value)
-
-            if not password_reset_data.is_active:
-                raise serializers.ValidationError('Invalid hash')
-
-            return value
+    def validate(self, attrs):
+        reset_data = PasswordResetData.objects.get_active(attrs.get('hash'))
+        if reset_data is None:
+            raise serializers.ValidationError({'hash': 'Invalid hash'})
 
-        except PasswordResetData.DoesNotExist:
-            raise serializers.ValidationError('Invalid hash')
+        attrs['reset_data'] = reset_data
+        return attrs
 
-    def create(self, validated_data) -> None:
-        data = PasswordResetData.objects.get(hash_str=validated_data.get('hash'))
-        data.complete(validated_data.get('password'))
-        user = data.user
-        return user
+    def create(self, validated_data) -> User:
+        return validated_data['reset_data'].complete(validated_data.get('password'))
 
     def update(self, instance, validated_data):
         raise ValueError(_('Method not allowed'))
@@ -1,10 +1,10 @@
 import logging
 
 from django.db import transaction
-from django.template import Context
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
+from common.models import push_templates
 from user.models import User, FirebaseToken, Notification
 
 log = logging.getLogger('app')
@@ -80,6 +80,8 @@ class InviteUserSerializer(serializers.ModelSerializer):
 
 
 class FirebaseTokenUserSerializer(serializers.ModelSerializer):
+    # registering known token again only refreshes it, no unique validator
+    token = serializers.CharField(max_length=2048)
 
     class Meta:
         model = FirebaseToken
@@ -87,33 +89,39 @@ class FirebaseTokenUserSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def create(self, validated_data):
-        budget = self.context['request'].user
-        firebase_token, created = FirebaseToken.objects.update_or_create(
-            user=budget,
-            defaults={
-                'token': self.validated_data.get('token', None)
-            }
-        )
-        return firebase_token
+        return FirebaseToken.objects.register(self.context['request'].user, validated_data['token'])
 
     def update(self, instance, validated_data):
         raise ValueError('Method not allowed')
 
 
+class NotificationListSerializer(serializers.ListSerializer):
+    """Resolves push templates (for rows without stored message) and user payload once for the whole page"""
+
+    def to_representation(self, data):
+        self.child.templates = push_templates.snapshot()
+        self.child.users = {}
+        return super().to_representation(data)
+
+
 class NotificationSerializer(serializers.ModelSerializer):
 
-    user = UserSerializer(read_only=True)
+    user = serializers.SerializerMethodField(read_only=True)
     massage = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Notification
         fields = ('id', 'user', 'created', 'massage')
-
-    @staticmethod
-    def get_massage(obj):
-        tmpl = User.get_template_push(obj.event)
-        context = Context({
-            'url': obj.mission.id,
-            'datetime': obj.created,
-        })
-        return tmpl.format(context)
+        list_serializer_class = NotificationListSerializer
+
+    def get_user(self, obj):
+        users = getattr(self, 'users', {})
+        if obj.user_id not in users:
+            users[obj.user_id] = UserSerializer(obj.user, context=self.context).data
+        return users[obj.user_id]
+
+    def get_massage(self, obj):
+        if obj.title is not None:
+            return obj.title, obj.body
+        # created before messages were stored and not backfilled yet
+        return obj.render_message(getattr(self, 'templates', None))
@@ -0,0 +1,127 @@
+"""
+Server-sent events stream of new notifications, served by budget.asgi.
+
+    GET /api/v1/user/notifications/stream/?token=<jwt>
+
+Token is taken from the Authorization header or, as EventSource can not set
+headers, from the token query parameter. Stream starts with the unread count
+and then sends every new notification of the user:
+
+    event: unread
+    data: {"new_messages": 3}
+
+    id: 42
+    event: notification
+    data: {"id": 42, "event": "new_message", "created": "...", "new_messages": 4}
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+import jwt
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_jwt.settings import api_settings
+
+from user import counters
+from user.authentication import CachedJSONWebTokenAuthentication
+from user.events import dispatcher
+
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    # nginx must not buffer the stream
+    (b'x-accel-buffering', b'no'),
+]
+
+
+async def respond(send, status: int, body: bytes = b'') -> None:
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def format_event(event: str, data: dict, event_id=None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    lines.append('event: {}'.format(event))
+    lines.append('data: {}'.format(json.dumps(data)))
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def get_token(scope) -> str:
+    prefix = api_settings.JWT_AUTH_HEADER_PREFIX.lower()
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            parts = value.decode('latin1').split()
+            if len(parts) == 2 and parts[0].lower() == prefix:
+                return parts[1]
+
+    tokens = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    return tokens[0] if tokens else None
+
+
+def authenticate(token: str):
+    """Same checks as CachedJSONWebTokenAuthentication, returns user or None"""
+
+    if not token:
+        return None
+
+    close_old_connections()
+    try:
+        payload = api_settings.JWT_DECODE_HANDLER(token)
+        return CachedJSONWebTokenAuthentication().authenticate_credentials(payload)
+    except (jwt.InvalidTokenError, AuthenticationFailed):
+        return None
+    finally:
+        close_old_connections()
+
+
+async def wait_disconnect(receive) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def notification_stream(scope, receive, send) -> None:
+    loop = asyncio.get_event_loop()
+    user = await loop.run_in_executor(None, authenticate, get_token(scope))
+    if user is None:
+        await respond(send, 401, b'Authentication credentials were not provided or are invalid.')
+        return
+
+    queue = dispatcher.subscribe(user.pk)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        unread = await loop.run_in_executor(None, counters.get_unread, user.pk)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': STREAM_HEADERS})
+        await send({
+            'type': 'http.response.body',
+            'body': format_event('unread', {'new_messages': unread}),
+            'more_body': True,
+        })
+
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            await asyncio.wait(
+                [message, disconnect],
+                timeout=settings.NOTIFICATION_STREAM_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect.done():
+                message.cancel()
+                break
+
+            if message.done():
+                data = message.result()
+                data.pop('user_id', None)
+                body = format_event('notification', data, data['id'])
+            else:
+                message.cancel()
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        disconnect.cancel()
+        dispatcher.unsubscribe(user.pk, queue)
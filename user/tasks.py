@@ -1,12 +1,16 @@
 import json
 import logging
 
-import requests
 from celery.task import task
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
 from django.http import HttpResponse
 
+from budget.http import get_session
+from user import last_login, retention
+from user.delivery import DeliveryEngine
+from user.mailing import substitute
+
 
 @task
 def send_message(conf, to, subject, message):
@@ -24,7 +28,7 @@ def send_message(conf, to, subject, message):
             html_message=message
         )
     else:
-        res = requests.post(
+        res = get_session().post(
             conf['mailgun_api_url'],
             auth=("api", conf['mailgun_api_key']),
             data={
@@ -40,6 +44,96 @@ def send_message(conf, to, subject, message):
         logging.debug('Result: %s' % res)
 
 
+@task
+def send_message_batch(conf, recipients, subject, message):
+    """
+    Send one email to many recipients.
+    recipients maps email to its values for %recipient.<name>% placeholders.
+    """
+
+    logging.debug('To: %s recipients' % len(recipients))
+    logging.debug('From: %s' % conf['email_noreply'])
+
+    if not recipients:
+        return
+
+    if not conf['mailgun_api_url']:
+        connection = get_connection()
+        messages = []
+        for email, variables in recipients.items():
+            mail = EmailMultiAlternatives(
+                subject=substitute(subject, variables),
+                body='',
+                from_email=conf['email_noreply'],
+                to=[email],
+                connection=connection,
+            )
+            mail.attach_alternative(substitute(message, variables), 'text/html')
+            messages.append(mail)
+        connection.send_messages(messages)
+    else:
+        res = get_session().post(
+            conf['mailgun_api_url'],
+            auth=("api", conf['mailgun_api_key']),
+            data={
+                "from": conf['email_noreply'],
+                "to": list(recipients),
+                "subject": subject,
+                "html": message,
+                "recipient-variables": json.dumps(recipients),
+                "o:native-send": "yes"
+            },
+            timeout=settings.REQUEST_TIMEOUT_SECONDS
+        )
+
+        logging.debug('Result: %s' % res)
+
+
+# FCM per-token errors after which the token will never be accepted again
+FIREBASE_DEAD_TOKEN_ERRORS = ('NotRegistered', 'InvalidRegistration', 'MismatchSenderId')
+
+
+def _post_push(conf, tokens, title, message):
+    data = {
+        'notification': {
+            'title': title,
+            'body': message,
+            'sound': 'default'
+        },
+        'data': {
+            'title': title,
+            'body': message,
+        },
+        'registration_ids': tokens
+    }
+
+    return get_session().post(
+        url=conf['firebase_url_request'],
+        data=json.dumps(data),
+        headers={
+            'content-type': 'application/json',
+            'authorization': 'key=' + conf['firebase_key_server'],
+        },
+        timeout=settings.REQUEST_TIMEOUT_SECONDS
+    )
+
+
+def get_dead_tokens(tokens, response_data) -> list:
+    """Tokens FCM reported as permanently invalid, results are in request order"""
+
+    results = response_data.get('results') or []
+    return [
+        token for token, result in zip(tokens, results)
+        if result.get('error') in FIREBASE_DEAD_TOKEN_ERRORS
+    ]
+
+
+def prune_dead_tokens(tokens, response_data) -> int:
+    from user.models import FirebaseToken
+
+    return FirebaseToken.objects.prune(get_dead_tokens(tokens, response_data))
+
+
 @task
 def send_push(conf, token, title, message):
     """Send push notification"""
@@ -50,31 +144,86 @@ def send_push(conf, token, title, message):
     logging.debug('Message: %s' % message)
 
     if conf['firebase_key_server']:
-        data = {
-            'notification': {
-                'title': title,
-                'body': message,
-                'sound': 'default'
-            },
-            'data': {
-                'title': title,
-                'body': message,
-            },
-            'registration_ids': token
-        }
-
-        response = requests.post(
-            url=conf['firebase_url_request'],
-            data=json.dumps(data),
-            headers={
-                'content-type': 'application/json',
-                'authorization': 'key=' + conf['firebase_key_server'],
-            },
-            timeout=settings.REQUEST_TIMEOUT_SECONDS
-        )
+        response = _post_push(conf, [token], title, message)
         if response.status_code != HttpResponse.status_code:
             logger = logging.getLogger(__name__)
             logger.error(
                 'Для пользователя - "{}" не получилось отправить пуш уведомление - "{}".'.format(token, title),
                 exc_info=True,
             )
+            return
+        prune_dead_tokens([token], response.json())
+
+
+@task
+def send_push_batch(conf, tokens, title, message):
+    """Send one push notification to up to FIREBASE_BATCH_SIZE devices with a single request"""
+
+    logging.debug('To: %s devices' % len(tokens))
+    logging.debug('Title: %s' % title)
+
+    if not conf['firebase_key_server'] or not tokens:
+        return
+
+    response = _post_push(conf, tokens, title, message)
+    if response.status_code != HttpResponse.status_code:
+        logger = logging.getLogger(__name__)
+        logger.error(
+            'Не получилось отправить пуш уведомление "{}" на {} устройств, статус {}.'.format(
+                title, len(tokens), response.status_code
+            ),
+        )
+        return
+
+    pruned = prune_dead_tokens(tokens, response.json())
+    logging.debug('Pruned: %s dead tokens' % pruned)
+
+
+@task
+def deliver_batch(jobs):
+    """Deliver many email and push jobs concurrently from one worker process"""
+
+    smtp_jobs, http_jobs = [], []
+    for job in jobs:
+        is_smtp = job['type'] == 'email' and not job['conf']['mailgun_api_url']
+        (smtp_jobs if is_smtp else http_jobs).append(job)
+
+    for job in smtp_jobs:
+        send_message_batch(job['conf'], job['recipients'], job['subject'], job['html'])
+
+    results = DeliveryEngine().deliver(http_jobs)
+
+    dead_tokens = []
+    for job, result in zip(http_jobs, results):
+        if job['type'] == 'push' and result['status'] == HttpResponse.status_code and result['data']:
+            dead_tokens.extend(get_dead_tokens(job['tokens'], result['data']))
+
+    if dead_tokens:
+        from user.models import FirebaseToken
+        FirebaseToken.objects.prune(dead_tokens)
+
+
+@task
+def flush_last_login():
+    """Write last_login times buffered by token obtain"""
+
+    updated = last_login.flush()
+    logging.debug('Last login flushed for %s users' % updated)
+
+
+@task
+def prune_stale_firebase_tokens():
+    """Delete tokens of devices not seen for FIREBASE_TOKEN_TTL_DAYS"""
+
+    from user.models import FirebaseToken
+
+    pruned = FirebaseToken.objects.prune_stale()
+    logging.debug('Stale firebase tokens pruned: %s' % pruned)
+
+
+@task
+def prune_notifications():
+    """Delete or archive notifications older than NOTIFICATION_RETENTION_DAYS"""
+
+    pruned = retention.prune()
+    logging.debug('Notifications pruned: %s' % pruned)
@@ -0,0 +1,59 @@
+from django.test import TestCase
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.settings import api_settings
+
+from user.auth_cache import auth_user_cache
+from user.authentication import CachedJSONWebTokenAuthentication
+from user.models import User
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+
+    PASSWORD = 'TestPassword123'
+
+    def setUp(self):
+        auth_user_cache.clear()
+        self.user = User.objects.create_user(
+            email='user@budget.com',
+            password=self.PASSWORD,
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        self.factory = APIRequestFactory()
+        self.auth = CachedJSONWebTokenAuthentication()
+
+        self.token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(self.user))
+
+    def _authenticate(self):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='JWT {}'.format(self.token))
+        return self.auth.authenticate(request)
+
+    def test_repeated_requests_skip_database(self):
+        self.assertEqual(self._authenticate()[0], self.user)
+
+        with self.assertNumQueries(0):
+            user, token = self._authenticate()
+
+        self.assertEqual(user.email, self.user.email)
+        self.assertEqual(user.get_full_name(), self.user.get_full_name())
+        self.assertTrue(user.is_active)
+        self.assertIsNot(user, self._authenticate()[0])
+
+    def test_password_change_revokes_tokens(self):
+        self._authenticate()
+
+        self.user.set_password('NewPassword123')
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate()
+
+    def test_deactivated_user_is_rejected(self):
+        self._authenticate()
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate()
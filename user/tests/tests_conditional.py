@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_jwt.settings import api_settings
+
+from common.models import PushTemplate
+from user import last_login
+from user.auth_cache import auth_user_cache
+from user.models import User, Notification
+from user.tests.tests_notifications import run_on_commit
+from user.views import JWTUserPayloadView, ProfileViewSet
+
+
+class ConditionalGetTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        PushTemplate.reset_defaults()
+
+    def setUp(self):
+        run_on_commit(self)
+        self.user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+            is_superuser=True,
+        )
+        Notification.objects.create(user=self.user, event='new_message')
+        self.factory = APIRequestFactory()
+
+    def _get(self, view, etag=None, **kwargs):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        request = self.factory.get('/', **headers)
+        force_authenticate(request, user=self.user)
+        return view(request, **kwargs)
+
+    def _get_self_info(self, etag=None):
+        return self._get(JWTUserPayloadView.as_view(), etag)
+
+    def _get_notifications(self, etag=None):
+        return self._get(ProfileViewSet.as_view({'get': 'notifications'}), etag, pk=self.user.pk)
+
+    def test_self_info(self):
+        response = self._get_self_info()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with mock.patch('user.serializers.JWTUserPayloadSerializer') as serializer:
+            with self.assertNumQueries(0):
+                response = self._get_self_info(etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        serializer.assert_not_called()
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        response = self._get_self_info(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(LAST_LOGIN_BUFFER='memory')
+    def test_self_info_changes_after_login_flush(self):
+        auth_user_cache.clear()
+        token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(self.user))
+
+        def get_self_info(etag=None):
+            headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+            request = self.factory.get('/', HTTP_AUTHORIZATION='JWT {}'.format(token), **headers)
+            return JWTUserPayloadView.as_view()(request)
+
+        etag = get_self_info()['ETag']
+        self.assertEqual(get_self_info(etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        last_login.record_login(self.user)
+        last_login.flush()
+
+        response = get_self_info(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['last_login'])
+
+    def test_notifications(self):
+        response = self._get_notifications()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self._get_notifications(etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Notification.objects.create(user=self.user, event='new_message')
+        response = self._get_notifications(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    @override_settings(LAST_LOGIN_BUFFER='memory')
+    def test_notifications_change_with_user_and_templates(self):
+        etag = self._get_notifications()['ETag']
+
+        last_login.record_login(self.user)
+        last_login.flush()
+        etag_after_login = self._get_notifications(etag)['ETag']
+        self.assertNotEqual(etag_after_login, etag)
+
+        tmpl = PushTemplate.objects.get(event='new_message', lang='ru')
+        tmpl.title = 'Changed'
+        tmpl.save()
+        self.assertEqual(self._get_notifications(etag_after_login).status_code, status.HTTP_200_OK)
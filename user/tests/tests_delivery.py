@@ -0,0 +1,93 @@
+import asyncio
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import SimpleTestCase
+
+from user.delivery import DeliveryEngine, email_job, push_job
+from user.tasks import deliver_batch
+
+
+class DeliveryEngineTestCase(SimpleTestCase):
+    """Engine against a local stub of Mailgun and FCM"""
+
+    def setUp(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail_first = 0
+
+    async def _handler(self, request):
+        self.requests.append(request.path)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+
+        if self.fail_first:
+            self.fail_first -= 1
+            return web.json_response({}, status=503)
+        if request.path == '/fcm':
+            body = await request.json()
+            return web.json_response({'results': [{'message_id': token} for token in body['registration_ids']]})
+        form = await request.post()
+        return web.json_response({'to': form.getall('to')})
+
+    def _deliver(self, jobs, **kwargs):
+        async def run():
+            app = web.Application()
+            app.router.add_post('/{provider}', self._handler)
+            server = TestServer(app)
+            await server.start_server()
+            try:
+                for job in jobs:
+                    job['conf'] = dict(
+                        job['conf'],
+                        mailgun_api_url=str(server.make_url('/mailgun')),
+                        firebase_url_request=str(server.make_url('/fcm')),
+                    )
+                engine = DeliveryEngine(rate_limits={}, backoff=0.01, timeout=5, **kwargs)
+                return await engine.run(jobs)
+            finally:
+                await server.close()
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+    def _conf(self):
+        return dict(mailgun_api_key='key', email_noreply='noreply@budget.pro', firebase_key_server='key')
+
+    def test_jobs_run_concurrently(self):
+        jobs = [push_job(self._conf(), ['token-{}'.format(i)], 'title', 'text') for i in range(20)]
+        jobs.append(email_job(self._conf(), {'a@budget.pro': {}, 'b@budget.pro': {}}, 'subj', 'html'))
+
+        results = self._deliver(jobs, concurrency=10)
+
+        self.assertEqual([result['status'] for result in results], [200] * 21)
+        self.assertEqual(results[0]['data'], {'results': [{'message_id': 'token-0'}]})
+        self.assertEqual(results[-1]['data'], {'to': ['a@budget.pro', 'b@budget.pro']})
+        self.assertEqual(self.max_in_flight, 10)
+
+    def test_retry_on_unavailable(self):
+        self.fail_first = 2
+
+        results = self._deliver([push_job(self._conf(), ['token'], 'title', 'text')], retries=3)
+
+        self.assertEqual(results[0]['status'], 200)
+        self.assertEqual(len(self.requests), 3)
+
+    @mock.patch('user.tasks.send_message_batch')
+    @mock.patch('user.tasks.DeliveryEngine.deliver')
+    def test_deliver_batch_splits_smtp_jobs(self, deliver, send_message_batch):
+        push = push_job(self._conf(), ['token'], 'title', 'text')
+        smtp = email_job(dict(self._conf(), mailgun_api_url=''), {'a@budget.pro': {}}, 'subj', 'html')
+        deliver.return_value = [dict(status=200, data=None)] * 2
+
+        deliver_batch([push, smtp, dict(push)])
+
+        deliver.assert_called_once_with([push, push])
+        send_message_batch.assert_called_once_with(smtp['conf'], smtp['recipients'], 'subj', 'html')
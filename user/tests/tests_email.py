@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.core import mail
+from django.template import TemplateSyntaxError
+from django.test import TestCase, override_settings
+from django.utils.html import escape
+
+from common.models import Configuration, EmailTemplate
+from user.mailing import get_recipient_variables, render_for_recipients
+from user.models import User, UsersSingUp
+from user.tasks import send_message_batch
+
+
+class BulkEmailTestCase(TestCase):
+
+    PASSWORD = 'TestPassword123'
+
+    @classmethod
+    def setUpTestData(cls):
+        Configuration.init_settings()
+        EmailTemplate.reset_defaults()
+
+        cls.inviter = User.objects.create_superuser(
+            email='superuser@budget.com',
+            password=cls.PASSWORD,
+            first_name='Chuck',
+            last_name='Norris',
+        )
+        for i in range(3):
+            User.objects.create_user(
+                email='user{}@budget.com'.format(i),
+                password=cls.PASSWORD,
+                first_name='Candidate{}'.format(i),
+                last_name='Beer',
+            )
+
+    def test_template_is_rendered_with_placeholders(self):
+        with mock.patch('user.models.celery_send_mail_batch') as task:
+            User.objects.send_email_bulk(User.objects.filter(is_superuser=False), 'password_reset_complete', lang='en')
+
+        conf, recipients, subject, html = task.delay.call_args[0]
+        self.assertIn('%recipient.user_full_name%', html)
+        self.assertEqual(recipients['user0@budget.com'], {'user_full_name': 'Candidate0 Beer'})
+
+    def test_recipient_values_are_escaped(self):
+        User.objects.filter(email='user0@budget.com').update(first_name='<b>Evil</b>')
+
+        with mock.patch('user.models.celery_send_mail_batch') as task:
+            task.delay.side_effect = send_message_batch
+            User.objects.send_email_bulk(
+                User.objects.filter(email='user0@budget.com'), 'password_reset_complete', lang='en'
+            )
+
+        html = mail.outbox[0].alternatives[0][0]
+        self.assertNotIn('<b>Evil</b>', html)
+        self.assertIn('&lt;b&gt;Evil&lt;/b&gt; Beer', html)
+
+    def test_filters_and_conditions_on_recipient_variables_are_rejected(self):
+        tmpl = EmailTemplate.objects.get(event='invite', lang='en')
+        for html in ('{{ user.first_name|upper }}', '{% if user.first_name %}Hi{% endif %}',
+                     '{% if not url_sign_up == 1 %}Hi{% endif %}'):
+            tmpl.html = html
+            tmpl.save()
+            with self.assertRaises(TemplateSyntaxError):
+                render_for_recipients(tmpl, {}, {'url_sign_up': str})
+
+        tmpl.html = '{{ user|upper }} {{ user.first_name }} {% if url %}{{ url_sign_up }}{% endif %}'
+        tmpl.save()
+        (subj, text, html), used = render_for_recipients(tmpl, {'user': 'Chuck'}, {'url_sign_up': str})
+        self.assertEqual(html, 'CHUCK  ')
+
+    def test_recipient_variables_are_resolved_by_prefix(self):
+        user = User.objects.get(email='user0@budget.com')
+        recipient_context = {'url_sign_up': lambda recipient: 'token', 'serial': lambda recipient: 7}
+
+        variables = get_recipient_variables(
+            user, {'user_first_name', 'user_get_full_name', 'url_sign_up', 'serial'}, recipient_context
+        )
+        self.assertEqual(variables, {
+            'user_first_name': user.first_name,
+            'user_get_full_name': escape(user.get_full_name()),
+            'url_sign_up': 'token',
+            'serial': '7',
+        })
+
+        for name in ('url_sign_up_token', 'first_name', 'user_parent_email'):
+            with self.assertRaises(TemplateSyntaxError):
+                get_recipient_variables(user, {name}, recipient_context)
+
+    @override_settings(MAILGUN_BATCH_SIZE=2)
+    def test_invite_bulk_over_smtp(self):
+        with mock.patch('user.models.celery_send_mail_batch') as task:
+            task.delay.side_effect = send_message_batch
+            with mock.patch('user.tasks.get_connection', wraps=mail.get_connection) as get_connection:
+                batches = User.objects.init_invite_bulk(
+                    User.objects.filter(is_superuser=False), self.inviter, lang='ru'
+                )
+
+        self.assertEqual(batches, 2)
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(User.objects.filter(is_superuser=False, is_active=True).exists())
+
+        for message in mail.outbox:
+            invite = UsersSingUp.objects.get(user__email=message.to[0])
+            html = message.alternatives[0][0]
+            self.assertIn(str(invite.token), html)
+            self.assertIn(self.inviter.get_full_name(), html)
@@ -0,0 +1,109 @@
+from itertools import chain, combinations
+from unittest import mock
+
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
+
+from user.filters import HierarchyPermissionFilterBackend
+from user.models import User
+from user.permissions import (
+    BudgetViewSetPermission,
+    BrigadierViewSetPermission,
+    CoordinatorViewSetPermission,
+    CandidateViewSetPermission,
+    UserProfileSetPermission,
+)
+from user.roles import ROLES, RoleSnapshot
+
+
+def subsets(items):
+    return chain.from_iterable(combinations(items, size) for size in range(len(items) + 1))
+
+
+class HierarchyPermissionFilterTestCase(TestCase):
+
+    PERMISSIONS = (
+        (BudgetViewSetPermission, ('user.view_budget', 'user.change_budget', 'user.delete_budget')),
+        (BrigadierViewSetPermission, ('user.view_brigadier', 'user.change_brigadier', 'user.delete_brigadier')),
+        (CoordinatorViewSetPermission, (
+            'user.view_coordinator', 'user.add_coordinator', 'user.change_coordinator', 'user.delete_coordinator'
+        )),
+        (CandidateViewSetPermission, ('user.view_candidate', 'user.change_candidate')),
+        (UserProfileSetPermission, ('user.view_profile', 'user.change_profile')),
+    )
+
+    @classmethod
+    def _create(cls, name, parent=None):
+        return User.objects.create_user(
+            email='{}@budget.com'.format(name),
+            password='TestPassword123',
+            first_name=name,
+            last_name='Beer',
+            parent=parent,
+        )
+
+    @classmethod
+    def setUpTestData(cls):
+        # top -> user -> child -> grandchild -> great-grandchild -> great-great-grandchild,
+        # sibling of user under top and a separate tree
+        cls.top = cls._create('top')
+        cls.user = cls._create('user', cls.top)
+        parent = cls.user
+        for name in ('child', 'grandchild', 'great-grandchild', 'great-great-grandchild'):
+            parent = cls._create(name, parent)
+        cls._create('sibling', cls.top)
+        cls._create('nephew', User.objects.get(email='sibling@budget.com'))
+        cls._create('stranger', cls._create('other'))
+
+    def _request(self, method, groups=(), permissions=()):
+        request = Request(getattr(RequestFactory(), method)('/'))
+        request.user = self.user
+        request.user_roles = RoleSnapshot(self.user, frozenset(groups), frozenset(permissions))
+        return request
+
+    def _view(self, permission, action, detail=False):
+        return mock.Mock(action=action, detail=detail, get_permissions=lambda: [permission])
+
+    def test_filter_agrees_with_object_permission(self):
+        users = list(User.objects.all())
+        backend = HierarchyPermissionFilterBackend()
+
+        for permission_class, permission_names in self.PERMISSIONS:
+            permission = permission_class()
+            for method, action in (('get', 'list'), ('patch', 'partial_update'), ('delete', 'destroy')):
+                for group in ROLES + (None,):
+                    for permissions in subsets(permission_names):
+                        request = self._request(method, [group] if group else [], permissions)
+                        view = self._view(permission, action)
+
+                        expected = {obj.pk for obj in users if permission.has_object_permission(request, view, obj)}
+                        filtered = set(
+                            backend.filter_queryset(request, User.objects.all(), view).values_list('pk', flat=True)
+                        )
+                        self.assertEqual(
+                            filtered, expected,
+                            msg='{} {} {} {}'.format(permission_class.__name__, method, group, permissions)
+                        )
+
+    def test_filter_is_one_query(self):
+        request = self._request('get', ['candidate'], ['user.view_budget'])
+        view = self._view(BudgetViewSetPermission(), 'list')
+
+        with self.assertNumQueries(1):
+            names = set(
+                HierarchyPermissionFilterBackend().filter_queryset(request, User.objects.all(), view)
+                .values_list('first_name', flat=True)
+            )
+        self.assertEqual(names, {'child', 'grandchild', 'great-grandchild'})
+
+    def test_detail_and_superuser_are_not_filtered(self):
+        backend = HierarchyPermissionFilterBackend()
+        queryset = User.objects.all()
+
+        permission = BudgetViewSetPermission()
+
+        request = self._request('get')
+        self.assertIs(backend.filter_queryset(request, queryset, self._view(permission, 'retrieve', True)), queryset)
+
+        request.user = User(is_superuser=True, is_active=True)
+        self.assertIs(backend.filter_queryset(request, queryset, self._view(permission, 'list')), queryset)
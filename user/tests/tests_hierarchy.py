@@ -0,0 +1,103 @@
+from django.test import TestCase
+
+from user import hierarchy
+from user.models import User, UserHierarchy
+from user.permissions import is_above
+
+
+class UserHierarchyTestCase(TestCase):
+
+    def _create(self, name, parent=None):
+        return User.objects.create_user(
+            email='{}@budget.com'.format(name),
+            password='TestPassword123',
+            first_name=name,
+            last_name='Beer',
+            parent=parent,
+        )
+
+    def setUp(self):
+        # budget -> brigadier -> coordinator -> candidate
+        self.budget = self._create('budget')
+        self.brigadier = self._create('brigadier', self.budget)
+        self.coordinator = self._create('coordinator', self.brigadier)
+        self.candidate = self._create('candidate', self.coordinator)
+
+    def _links(self):
+        return set(UserHierarchy.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_is_ancestor_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(hierarchy.is_ancestor(self.budget, self.candidate, 3))
+        self.assertFalse(hierarchy.is_ancestor(self.budget, self.candidate, 2))
+        self.assertTrue(hierarchy.is_ancestor(self.brigadier, self.candidate, 2))
+        self.assertFalse(hierarchy.is_ancestor(self.candidate, self.budget))
+        self.assertFalse(hierarchy.is_ancestor(self.budget, self.budget))
+
+    def test_descendants(self):
+        self.assertEqual(
+            set(User.objects.descendants_of(self.budget, max_depth=2)),
+            {self.brigadier, self.coordinator},
+        )
+        self.assertEqual(
+            set(User.objects.descendants_of(self.coordinator, include_self=True)),
+            {self.coordinator, self.candidate},
+        )
+
+    def test_reparent_moves_subtree(self):
+        other = self._create('other')
+        self.coordinator.parent = other
+        self.coordinator.save()
+
+        self.assertFalse(hierarchy.is_ancestor(self.brigadier, self.candidate))
+        self.assertTrue(hierarchy.is_ancestor(other, self.candidate, 2))
+        self.assertEqual(hierarchy.get_parent_id(self.coordinator), other.pk)
+
+        links = self._links()
+        self.assertEqual(hierarchy.rebuild(), len(links))
+        self.assertEqual(self._links(), links)
+
+    def test_save_with_same_parent_leaves_rows(self):
+        coordinator = User.objects.get(pk=self.coordinator.pk)
+        coordinator.description = 'changed'
+        with self.assertNumQueries(1):
+            coordinator.save()
+
+        coordinator.parent = self.budget
+        coordinator.save()
+        self.assertEqual(hierarchy.get_parent_id(coordinator), self.budget.pk)
+
+    def test_insert_bulk(self):
+        User.objects.bulk_create([
+            User(email='bulk{}@budget.com'.format(i), first_name='Bulk', last_name='Beer', parent=self.candidate)
+            for i in range(2)
+        ])
+        hierarchy.insert_bulk(User.objects.filter(email__startswith='bulk'))
+
+        links = self._links()
+        hierarchy.rebuild()
+        self.assertEqual(self._links(), links)
+
+    def test_cycle_is_rejected(self):
+        self.budget.parent = self.candidate
+        with self.assertRaises(ValueError):
+            self.budget.save()
+
+    def test_delete_keeps_subtree(self):
+        self.brigadier.delete()
+        self.coordinator.refresh_from_db()
+
+        self.assertIsNone(self.coordinator.parent_id)
+        self.assertFalse(hierarchy.is_ancestor(self.budget, self.candidate))
+        self.assertTrue(hierarchy.is_ancestor(self.coordinator, self.candidate, 1))
+
+        links = self._links()
+        hierarchy.rebuild()
+        self.assertEqual(self._links(), links)
+
+    def test_permission_checks(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(is_above(self.coordinator, self.candidate, 1))
+        with self.assertNumQueries(1):
+            self.assertTrue(is_above(self.budget, self.candidate, 3))
+        self.assertFalse(is_above(self.budget, self.candidate, 2))
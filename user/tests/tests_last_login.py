@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.settings import api_settings
+
+from budget.redis import get_redis
+from budget.views import obtain_jwt_token
+from user import last_login
+from user.auth_cache import auth_user_cache
+from user.authentication import CachedJSONWebTokenAuthentication
+from user.models import User
+
+
+@override_settings(LAST_LOGIN_BUFFER='memory')
+class DeferredLastLoginTestCase(TestCase):
+
+    PASSWORD = 'TestPassword123'
+
+    def setUp(self):
+        last_login.get_buffer().drain()
+        self.users = [
+            User.objects.create_user(
+                email='user{}@budget.com'.format(i),
+                password=self.PASSWORD,
+                first_name='Candidate',
+                last_name='Beer',
+            )
+            for i in range(3)
+        ]
+        self.factory = APIRequestFactory()
+
+    def _obtain_token(self, user):
+        data = {'email': user.email, 'password': self.PASSWORD}
+        request = self.factory.post('/api/v1/auth/obtain-token/', data=data, format='json')
+        response = obtain_jwt_token(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_last_login_converges_after_flush(self):
+        for user in self.users:
+            response = self._obtain_token(user)
+            self.assertIsNotNone(response.data['user']['last_login'])
+
+        self.assertFalse(User.objects.filter(last_login__isnull=False).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(last_login.flush(), 3)
+
+        self.assertFalse(User.objects.filter(last_login__isnull=True).exists())
+        self.assertEqual(last_login.flush(), 0)
+
+    def test_flush_invalidates_cached_auth_users(self):
+        auth_user_cache.clear()
+        user = self.users[0]
+        token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(user))
+        request = self.factory.get('/', HTTP_AUTHORIZATION='JWT {}'.format(token))
+        auth = CachedJSONWebTokenAuthentication()
+        self.assertIsNone(auth.authenticate(request)[0].last_login)
+
+        self._obtain_token(user)
+        last_login.flush()
+
+        user.refresh_from_db()
+        cached = auth.authenticate(request)[0]
+        self.assertEqual(cached.last_login, user.last_login)
+        self.assertEqual(cached.updated, user.updated)
+
+    def test_flush_bumps_auth_versions_in_one_pipeline(self):
+        for user in self.users:
+            self._obtain_token(user)
+        keys = ['version:auth_user:{}'.format(user.pk) for user in self.users]
+        redis = get_redis()
+        redis.delete(*keys)
+        # django_redis cache on the application redis
+        redis_cache = mock.Mock(make_key=lambda key: key)
+        redis_cache.client.get_client.return_value = redis
+
+        with mock.patch('budget.cache.cache', redis_cache), \
+                mock.patch.object(redis, 'pipeline', wraps=redis.pipeline) as pipeline:
+            last_login.flush()
+
+        pipeline.assert_called_once_with(transaction=False)
+        self.assertTrue(all(redis.mget(keys)))
+        redis.delete(*keys)
+
+    def test_latest_login_wins(self):
+        user = self.users[0]
+        self._obtain_token(user)
+        self._obtain_token(user)
+        recorded = last_login.get_buffer()._pending[user.pk]
+
+        last_login.flush()
+
+        user.refresh_from_db()
+        self.assertEqual(user.last_login.timestamp(), recorded)
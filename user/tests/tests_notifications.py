@@ -0,0 +1,270 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from budget.redis import get_redis
+from common.models import ConfigurationFireBase, PushTemplate, push_templates
+from user import counters, retention
+from user.models import FirebaseToken, User, Notification, NotificationArchive
+from user.serializers import NotificationSerializer
+from user.views import ProfileViewSet
+
+
+def run_on_commit(testcase):
+    """TestCase never commits, counters are updated in on_commit callbacks, run them right away"""
+
+    patcher = mock.patch('django.db.transaction.on_commit', side_effect=lambda func, using=None: func())
+    patcher.start()
+    testcase.addCleanup(patcher.stop)
+
+
+class NotificationsViewTestCase(TestCase):
+
+    PASSWORD = 'TestPassword123'
+
+    @classmethod
+    def setUpTestData(cls):
+        PushTemplate.reset_defaults()
+        cls.user = User.objects.create_superuser(
+            email='superuser@budget.com',
+            password=cls.PASSWORD,
+            first_name='Chuck',
+            last_name='Norris',
+        )
+        Notification.objects.bulk_create(
+            Notification(user=cls.user, event='new_message') for _ in range(60)
+        )
+
+    def setUp(self):
+        run_on_commit(self)
+        get_redis().delete(
+            counters.UNREAD_KEY.format(self.user.pk),
+            counters.READ_AT_KEY.format(self.user.pk),
+        )
+
+    def _get_notifications(self, size):
+        view = ProfileViewSet.as_view({'get': 'notifications'})
+        request = APIRequestFactory().get('/notifications/', {'size': size})
+        force_authenticate(request, user=self.user)
+        return view(request, pk=self.user.pk)
+
+    def _get_new_notifications(self):
+        view = ProfileViewSet.as_view({'get': 'new_notifications_count'})
+        request = APIRequestFactory().get('/new-notifications/')
+        force_authenticate(request, user=self.user)
+        return view(request, pk=self.user.pk)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self._get_notifications(1)
+
+        counts = []
+        for size in (5, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._get_notifications(size)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), size)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_rows_are_serialized(self):
+        response = self._get_notifications(2)
+
+        row = response.data['results'][0]
+        self.assertEqual(row['user']['email'], self.user.email)
+        self.assertEqual(len(row['massage']), 2)
+
+    def test_unread_counter(self):
+        Notification.objects.create(user=self.user, event='new_message')
+        Notification.objects.create(user=self.user, event='new_message')
+
+        with self.assertNumQueries(0):
+            response = self._get_new_notifications()
+        self.assertEqual(response.data, {'new_messages': 2})
+
+        self._get_notifications(10)
+        self.assertEqual(self._get_new_notifications().data, {'new_messages': 0})
+
+        Notification.objects.create(user=self.user, event='new_message')
+        self.assertEqual(self._get_new_notifications().data, {'new_messages': 1})
+
+    def test_rebuild_counters(self):
+        other = User.objects.create_user(
+            email='other@budget.com',
+            password=self.PASSWORD,
+            first_name='Other',
+            last_name='Beer',
+        )
+        get_redis().set(counters.UNREAD_KEY.format(other.pk), 5)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.rebuild([self.user.pk, other.pk]), 2)
+        self.assertEqual(counters.get_unread(self.user.pk), 60)
+        self.assertEqual(counters.get_unread(other.pk), 0)
+
+        counters.mark_read(self.user.pk)
+        Notification.objects.create(user=self.user, event='new_message')
+        get_redis().set(counters.UNREAD_KEY.format(self.user.pk), 42)
+
+        counters.rebuild([self.user.pk])
+        self.assertEqual(counters.get_unread(self.user.pk), 1)
+
+
+class BulkNotifyTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        PushTemplate.reset_defaults()
+        cls.users = [
+            User.objects.create_user(
+                email='user{}@budget.com'.format(i),
+                password='TestPassword123',
+                first_name='Candidate{}'.format(i),
+                last_name='Beer',
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        run_on_commit(self)
+        get_redis().delete(*[counters.UNREAD_KEY.format(user.pk) for user in self.users])
+
+    @override_settings(NOTIFICATION_BATCH_SIZE=2)
+    def test_notifications_are_created_in_batches(self):
+        users = User.objects.filter(pk__in=[user.pk for user in self.users])
+
+        push_templates.snapshot()
+        with mock.patch.object(User.objects, 'push_bulk') as push_bulk:
+            with self.assertNumQueries(4):
+                count = Notification.objects.bulk_notify(users, 'new_message', {'title': 'Hi'})
+
+        self.assertEqual(count, 5)
+        self.assertEqual(Notification.objects.filter(event='new_message').count(), 5)
+        self.assertEqual(len(set(Notification.objects.values_list('created', flat=True))), 1)
+        for user in self.users:
+            self.assertEqual(counters.get_unread(user.pk), 1)
+        notification = Notification.objects.first()
+        push_bulk.assert_called_once_with(users, notification.title, notification.body)
+
+    def test_message_is_stored(self):
+        with mock.patch.object(User.objects, 'push_bulk'):
+            Notification.objects.notify(self.users[0], 'new_message', {'url': 'mission-7'})
+
+        notification = Notification.objects.get(user=self.users[0])
+        self.assertEqual(notification.title, 'Сообщение')
+        self.assertIn('mission-7', notification.body)
+
+        with mock.patch('common.models.PushTemplate.format') as render:
+            data = NotificationSerializer([notification], many=True).data
+        render.assert_not_called()
+        self.assertEqual(data[0]['massage'], (notification.title, notification.body))
+
+    @override_settings(DELIVERY_ASYNC=False)
+    @mock.patch('user.models.celery_send_push_batch')
+    def test_pushed_text_is_the_stored_one(self, task):
+        ConfigurationFireBase.init_settings()
+        FirebaseToken.objects.create(user=self.users[0], token='token-0')
+        tmpl = PushTemplate.objects.get(event='new_message', lang='ru')
+        tmpl.text = 'At {{ datetime }} in {{ url }}'
+        tmpl.save()
+
+        Notification.objects.notify(self.users[0], 'new_message', {'url': 'mission-7'})
+
+        notification = Notification.objects.get(user=self.users[0])
+        self.assertIn(str(notification.created.year), notification.body)
+        conf, tokens, title, body = task.delay.call_args[0]
+        self.assertEqual(tokens, ['token-0'])
+        self.assertEqual((title, body), (notification.title, notification.body))
+
+    def test_backfill_messages(self):
+        Notification.objects.bulk_create(Notification(user=user, event='new_message') for user in self.users)
+
+        call_command('backfill_notification_messages', batch_size=2, stdout=StringIO())
+
+        self.assertFalse(Notification.objects.filter(title__isnull=True).exists())
+        self.assertEqual(set(Notification.objects.values_list('title', flat=True)), {'Сообщение'})
+
+    def test_notify_without_push(self):
+        with mock.patch.object(User.objects, 'push_bulk') as push_bulk:
+            self.assertEqual(Notification.objects.notify(self.users[0], 'new_message', push=False), 1)
+
+        push_bulk.assert_not_called()
+        self.assertEqual(counters.get_unread(self.users[0].pk), 1)
+
+
+class UnreadCounterCommitTestCase(TransactionTestCase):
+
+    def test_rolled_back_notification_is_not_counted(self):
+        user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        get_redis().delete(counters.UNREAD_KEY.format(user.pk))
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Notification.objects.create(user=user, event='new_message')
+                raise RuntimeError()
+        self.assertEqual(counters.get_unread(user.pk), 0)
+
+        Notification.objects.create(user=user, event='new_message')
+        self.assertEqual(counters.get_unread(user.pk), 1)
+
+
+class RetentionTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        now = timezone.now()
+        Notification.objects.bulk_create(
+            Notification(user=cls.user, event='new_message', created=now - timedelta(days=days))
+            for days in (1, 10, 40, 50, 60)
+        )
+
+    def test_old_notifications_are_deleted_in_batches(self):
+        with mock.patch('user.retention.prune_batch', wraps=retention.prune_batch) as prune_batch:
+            self.assertEqual(retention.prune(days=30, batch_size=2, archive=False), 3)
+
+        self.assertEqual(prune_batch.call_count, 2)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    def test_pruned_unread_rows_are_taken_off_counters(self):
+        # read 45 days ago, rows of 1, 10 and 40 days are unread
+        read_at = timezone.now() - timedelta(days=45)
+        get_redis().set(counters.READ_AT_KEY.format(self.user.pk), read_at.timestamp())
+        get_redis().set(counters.UNREAD_KEY.format(self.user.pk), 3)
+        version = counters.get_version(self.user.pk)
+
+        retention.prune(days=30, batch_size=2, archive=False)
+
+        self.assertEqual(counters.get_unread(self.user.pk), 2)
+        self.assertNotEqual(counters.get_version(self.user.pk), version)
+
+    def test_old_notifications_are_archived(self):
+        old = list(Notification.objects.filter(created__lt=retention.get_cutoff(30)).order_by('pk'))
+
+        self.assertEqual(retention.prune(days=30, batch_size=10, archive=True), 3)
+
+        archived = NotificationArchive.objects.order_by('notification_id')
+        self.assertEqual(
+            [(row.notification_id, row.created, row.user_id) for row in archived],
+            [(row.pk, row.created, row.user_id) for row in old],
+        )
+        self.assertEqual(Notification.objects.count(), 2)
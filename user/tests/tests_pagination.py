@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from user.models import User, Notification
+from user.pagination import KeysetPagination
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        now = timezone.now()
+        # pairs of notifications share created time to check ties are resolved by id
+        Notification.objects.bulk_create(
+            Notification(user=cls.user, event='new_message', created=now - timedelta(seconds=i // 2))
+            for i in range(25)
+        )
+
+    def _page(self, url):
+        request = Request(APIRequestFactory().get(url))
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(Notification.objects.filter(user=self.user), request)
+        return page, paginator.get_next_link()
+
+    def test_walks_all_rows_in_order(self):
+        seen = []
+        url = '/notifications/?size=10'
+        while url:
+            page, url = self._page(url)
+            self.assertLessEqual(len(page), 10)
+            seen.extend(page)
+
+        expected = list(Notification.objects.filter(user=self.user).order_by('-created', '-id'))
+        self.assertEqual(seen, expected)
+
+    def test_deep_page_is_single_query(self):
+        page, url = self._page('/notifications/?size=20')
+
+        with self.assertNumQueries(1):
+            page, url = self._page(url)
+
+        self.assertEqual(len(page), 5)
+        self.assertIsNone(url)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            self._page('/notifications/?cursor=garbage')
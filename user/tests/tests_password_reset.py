@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APIRequestFactory
+
+from budget.redis import get_redis
+from user import reset_attempts
+from user.models import PasswordResetData, User
+from user.serializers import CheckCodeSerializer, RecoverySetNewPassword
+from user.views import CheckResetCodeView
+
+
+class PasswordResetTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        get_redis().delete(reset_attempts.ATTEMPTS_KEY.format(self.user.email))
+        self.reset_data = PasswordResetData.objects.create(
+            user=self.user,
+            hash_str='c4292a70-c917-4cdb-9444-b8f78f0de60f',
+            code='12345678',
+        )
+
+    def test_code_check_is_one_query(self):
+        serializer = CheckCodeSerializer(data={'email': self.user.email, 'code': '12345678'})
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+            self.assertEqual(serializer.save(), self.reset_data.hash_str)
+
+        serializer = CheckCodeSerializer(data={'email': self.user.email, 'code': '87654321'})
+        self.assertFalse(serializer.is_valid())
+
+    @override_settings(PASSWORD_RESET_MAX_ATTEMPTS=3)
+    def test_attempts_are_limited_per_email(self):
+        for _ in range(3):
+            serializer = CheckCodeSerializer(data={'email': self.user.email, 'code': '00000000'})
+            self.assertFalse(serializer.is_valid())
+
+        request = APIRequestFactory().post(
+            reverse('check-code'), data={'email': self.user.email.upper(), 'code': '12345678'}, format='json'
+        )
+        with self.assertNumQueries(0):
+            response = CheckResetCodeView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(PASSWORD_RESET_MAX_ATTEMPTS=4)
+    def test_requesting_new_code_does_not_reset_attempts(self):
+        for _ in range(2):
+            self.user.init_pass_reset_process()
+            for _ in range(2):
+                CheckCodeSerializer(data={'email': self.user.email, 'code': '00000000'}).is_valid()
+
+        self.user.init_pass_reset_process()
+        code = PasswordResetData.objects.get(user=self.user).code
+        with self.assertRaises(Throttled):
+            CheckCodeSerializer(data={'email': self.user.email, 'code': code}).is_valid()
+
+        # window expired
+        get_redis().delete(reset_attempts.ATTEMPTS_KEY.format(self.user.email))
+        self.assertTrue(CheckCodeSerializer(data={'email': self.user.email, 'code': code}).is_valid())
+
+    def test_accepted_code_clears_attempts(self):
+        CheckCodeSerializer(data={'email': self.user.email, 'code': '00000000'}).is_valid()
+        CheckCodeSerializer(data={'email': self.user.email, 'code': '12345678'}).is_valid()
+
+        self.assertIsNone(get_redis().get(reset_attempts.ATTEMPTS_KEY.format(self.user.email)))
+
+    def test_new_password_looks_reset_data_up_once(self):
+        serializer = RecoverySetNewPassword(data={
+            'hash': self.reset_data.hash_str,
+            'password': 'qwerty123',
+            'confirm_password': 'qwerty123',
+        })
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+        self.assertEqual(serializer.save(), self.user)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('qwerty123'))
+        self.assertFalse(PasswordResetData.objects.exists())
+
+        serializer = RecoverySetNewPassword(data={
+            'hash': self.reset_data.hash_str,
+            'password': 'qwerty123',
+            'confirm_password': 'qwerty123',
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('hash', serializer.errors)
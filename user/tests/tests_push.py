@@ -0,0 +1,127 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from common.models import ConfigurationFireBase, PushTemplate
+from user.models import User, FirebaseToken
+from user.serializers import FirebaseTokenUserSerializer
+from user.tasks import send_push_batch
+
+
+class PushTestCase(TestCase):
+
+    PASSWORD = 'TestPassword123'
+
+    @classmethod
+    def setUpTestData(cls):
+        ConfigurationFireBase.init_settings()
+        PushTemplate.reset_defaults()
+
+        cls.users = []
+        for i in range(3):
+            user = User.objects.create_user(
+                email='user{}@budget.com'.format(i),
+                password=cls.PASSWORD,
+                first_name='Candidate',
+                last_name='Beer',
+            )
+            FirebaseToken.objects.create(user=user, token='token-{}'.format(i))
+            cls.users.append(user)
+
+    @override_settings(FIREBASE_BATCH_SIZE=2)
+    @mock.patch('user.models.celery_send_push_batch')
+    def test_send_push_bulk_groups_tokens(self, task):
+        batches = User.objects.send_push_bulk(
+            User.objects.all(), 'new_message', {'url': 1, 'datetime': 'now'}
+        )
+
+        self.assertEqual(batches, 2)
+        sent = [call[0][1] for call in task.delay.call_args_list]
+        self.assertEqual(sorted(sum(sent, [])), ['token-0', 'token-1', 'token-2'])
+        self.assertEqual(max(len(tokens) for tokens in sent), 2)
+
+    @mock.patch('user.tasks.get_session')
+    def test_send_push_batch_prunes_dead_tokens(self, get_session):
+        post = get_session.return_value.post
+        post.return_value.status_code = 200
+        post.return_value.json.return_value = {
+            'results': [
+                {'message_id': '1'},
+                {'error': 'NotRegistered'},
+                {'error': 'Unavailable'},
+            ]
+        }
+        conf = {'firebase_key_server': 'key', 'firebase_url_request': 'http://fcm.local/send'}
+
+        send_push_batch(conf, ['token-0', 'token-1', 'token-2'], 'title', 'text')
+
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(
+            sorted(FirebaseToken.objects.values_list('token', flat=True)),
+            ['token-0', 'token-2'],
+        )
+
+
+class FirebaseTokenTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        ConfigurationFireBase.init_settings()
+        cls.user, cls.other = [
+            User.objects.create_user(
+                email='user{}@budget.com'.format(i),
+                password='TestPassword123',
+                first_name='Candidate',
+                last_name='Beer',
+            )
+            for i in range(2)
+        ]
+
+    def test_push_is_sent_to_every_device_with_one_query(self):
+        FirebaseToken.objects.register(self.user, 'phone')
+        FirebaseToken.objects.register(self.user, 'tablet')
+        FirebaseToken.objects.register(self.other, 'other')
+        ConfigurationFireBase.get_settings()
+
+        with mock.patch('user.models.celery_send_push_batch') as task:
+            with self.assertNumQueries(1):
+                self.user.send_push('title', 'text')
+
+        self.assertEqual(sorted(task.delay.call_args[0][1]), ['phone', 'tablet'])
+
+    def test_tokens_are_loaded_for_many_users(self):
+        FirebaseToken.objects.register(self.user, 'phone')
+        FirebaseToken.objects.register(self.user, 'tablet')
+        FirebaseToken.objects.register(self.other, 'other')
+
+        with self.assertNumQueries(1):
+            tokens = FirebaseToken.objects.by_user(User.objects.all())
+
+        self.assertEqual(sorted(tokens[self.user.pk]), ['phone', 'tablet'])
+        self.assertEqual(tokens[self.other.pk], ['other'])
+
+    def test_registering_known_token(self):
+        request = APIRequestFactory().post('/')
+        request.user = self.user
+        first = FirebaseToken.objects.register(self.other, 'phone')
+        FirebaseToken.objects.filter(pk=first.pk).update(last_seen=timezone.now() - timedelta(days=1))
+
+        serializer = FirebaseTokenUserSerializer(data={'token': 'phone'}, context={'request': request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        token = FirebaseToken.objects.get(token='phone')
+        self.assertEqual(token.pk, first.pk)
+        self.assertEqual(token.user, self.user)
+        self.assertGreater(token.last_seen, timezone.now() - timedelta(minutes=1))
+
+    def test_stale_tokens_are_pruned(self):
+        FirebaseToken.objects.register(self.user, 'phone')
+        FirebaseToken.objects.register(self.user, 'lost')
+        FirebaseToken.objects.filter(token='lost').update(last_seen=timezone.now() - timedelta(days=300))
+
+        self.assertEqual(FirebaseToken.objects.prune_stale(), 1)
+        self.assertEqual(list(FirebaseToken.objects.values_list('token', flat=True)), ['phone'])
@@ -0,0 +1,158 @@
+from unittest import mock
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
+
+from budget.cache import VersionStamp
+from user.bitsets import permission_bitsets
+from user.middleware import UserRolesMiddleware
+from user.models import User
+from user.permissions import BudgetViewSetPermission
+from user.roles import for_request, get_roles
+
+
+class UserRolesTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        content_type = ContentType.objects.get_for_model(User)
+        cls.view_budget = Permission.objects.create(
+            codename='view_budget', name='Can view budget', content_type=content_type
+        )
+        cls.brigadier = Group.objects.create(name='brigadier')
+        cls.brigadier.permissions.add(cls.view_budget)
+
+    def setUp(self):
+        cache.clear()
+        permission_bitsets.get()
+        self.user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        self.user.groups.add(self.brigadier)
+        self.other = User.objects.create_user(
+            email='other@budget.com',
+            password='TestPassword123',
+            first_name='Other',
+            last_name='Beer',
+            parent=self.user,
+        )
+
+    def test_snapshot_is_cached(self):
+        with self.assertNumQueries(1):
+            roles = get_roles(self.user)
+        self.assertTrue(roles.is_brigadier)
+        self.assertFalse(roles.is_budget)
+        self.assertTrue(roles.has_perm('user.view_budget'))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(get_roles(self.user).is_brigadier)
+
+    def test_group_changes_invalidate_snapshot(self):
+        get_roles(self.user)
+
+        self.user.groups.add(Group.objects.create(name='budget'))
+        self.assertTrue(get_roles(self.user).is_budget)
+
+        self.brigadier.permissions.remove(self.view_budget)
+        self.assertFalse(get_roles(self.user).has_perm('user.view_budget'))
+
+        self.brigadier.user_set.remove(self.user)
+        self.assertFalse(get_roles(self.user).is_brigadier)
+
+    def test_permission_classes_share_request_snapshot(self):
+        request = Request(RequestFactory().get('/'))
+        request.user = self.user
+        view = mock.Mock(action='retrieve')
+        permission = BudgetViewSetPermission()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(permission.has_permission(request, view))
+            self.assertTrue(permission.has_object_permission(request, view, self.other))
+        self.assertIs(request.user_roles, for_request(request))
+
+    def test_middleware_resolves_lazily(self):
+        django_request = RequestFactory().get('/')
+
+        def view(request):
+            drf_request = Request(request)
+            drf_request.user = self.user
+            self.assertTrue(drf_request.user_roles.is_brigadier)
+            return HttpResponse()
+
+        UserRolesMiddleware(view)(django_request)
+
+
+class BitsetPermissionBackendTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        content_type = ContentType.objects.get_for_model(User)
+        cls.view_budget = Permission.objects.create(
+            codename='view_budget', name='Can view budget', content_type=content_type
+        )
+        cls.change_budget = Permission.objects.create(
+            codename='change_budget', name='Can change budget', content_type=content_type
+        )
+        cls.brigadier = Group.objects.create(name='brigadier')
+        cls.brigadier.permissions.add(cls.view_budget)
+
+        cls.user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        cls.user.groups.add(cls.brigadier)
+        cls.user.user_permissions.add(Permission.objects.get(codename='view_user'))
+
+    def setUp(self):
+        cache.clear()
+        permission_bitsets.get()
+
+    def _user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_has_perm_is_bit_test_after_one_query(self):
+        user = self._user()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(user.has_perm('user.view_budget'))
+            self.assertTrue(user.has_perm('user.view_user'))
+            self.assertFalse(user.has_perm('user.change_budget'))
+            self.assertFalse(user.has_perm('user.unknown'))
+            self.assertTrue(user.has_module_perms('user'))
+
+    def test_bitsets_version_is_read_once_per_user(self):
+        user = self._user()
+
+        with mock.patch.object(VersionStamp, 'get', autospec=True, side_effect=VersionStamp.get) as get_version:
+            for _ in range(3):
+                self.assertTrue(user.has_perm('user.view_budget'))
+                self.assertFalse(user.has_perm('user.change_budget'))
+            user.get_all_permissions()
+
+        self.assertEqual(get_version.call_count, 1)
+
+    def test_same_permissions_as_model_backend(self):
+        user = self._user()
+        backend = ModelBackend()
+
+        self.assertEqual(user.get_all_permissions(), backend.get_all_permissions(self._user()))
+        self.assertEqual(user.get_group_permissions(), backend.get_group_permissions(self._user()))
+
+    def test_group_permission_change_is_seen(self):
+        self.assertFalse(self._user().has_perm('user.change_budget'))
+
+        self.brigadier.permissions.add(self.change_budget)
+        self.assertTrue(self._user().has_perm('user.change_budget'))
+
+        self.brigadier.permissions.clear()
+        self.assertFalse(self._user().has_perm('user.view_budget'))
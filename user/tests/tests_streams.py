@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from django.test import TestCase
+from rest_framework_jwt.settings import api_settings
+
+from budget.redis import get_redis
+from user import counters, events
+from user.auth_cache import auth_user_cache
+from user.models import User, Notification
+from user.streams import notification_stream
+
+
+class NotificationStreamTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@budget.com',
+            password='TestPassword123',
+            first_name='Candidate',
+            last_name='Beer',
+        )
+        get_redis().set(counters.UNREAD_KEY.format(self.user.pk), 3)
+        self.token = api_settings.JWT_ENCODE_HANDLER(api_settings.JWT_PAYLOAD_HANDLER(self.user))
+        # stream authenticates in an executor thread, which has no access to the test database
+        auth_user_cache.clear()
+        auth_user_cache.resolve(self.user.pk)
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        get_redis().delete(counters.UNREAD_KEY.format(self.user.pk))
+
+    def _stream(self, query_string: bytes, until_events: int):
+        scope = {'type': 'http', 'path': '/', 'headers': [], 'query_string': query_string}
+        disconnect = asyncio.Event()
+        sent = []
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if sum(1 for m in sent if m.get('more_body')) >= until_events:
+                disconnect.set()
+
+        return scope, receive, send, sent
+
+    def test_unauthenticated(self):
+        scope, receive, send, sent = self._stream(b'token=invalid', 1)
+        self.loop.run_until_complete(notification_stream(scope, receive, send))
+
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_notifications_are_streamed(self):
+        scope, receive, send, sent = self._stream('token={}'.format(self.token).encode(), 2)
+        notification = Notification(pk=42, user=self.user, event='new_message')
+
+        async def publish():
+            # dispatcher thread subscribes to the channel in background, messages published
+            # before that are lost, stream disconnects after the first delivered one
+            while len(sent) < 3:
+                await self.loop.run_in_executor(None, events.publish, [
+                    events.notification_message(notification, 4),
+                    events.notification_message(Notification(pk=43, user_id=0, event='new_message'), 1),
+                ])
+                await asyncio.sleep(0.05)
+
+        self.loop.run_until_complete(asyncio.wait_for(
+            asyncio.gather(notification_stream(scope, receive, send), publish()), timeout=10
+        ))
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(sent[1]['body'], b'event: unread\ndata: {"new_messages": 3}\n\n')
+
+        lines = sent[2]['body'].decode().splitlines()
+        self.assertEqual(lines[:2], ['id: 42', 'event: notification'])
+        data = json.loads(lines[2][len('data: '):])
+        self.assertEqual(data['new_messages'], 4)
+        self.assertEqual(data['event'], 'new_message')
+        self.assertNotIn('user_id', data)
+        self.assertEqual(len(sent), 3)
@@ -239,3 +239,11 @@ class TestAuthViews(UserTestCase):
         response = view(request)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_full_name_annotation_is_read(self):
+        user = User.objects.with_full_name().get(pk=self.user.pk)
+        self.assertEqual(user.full_name_db, 'Candidate Beer')
+
+        user.full_name_db = 'Annotated'
+        self.assertEqual(user.full_name, 'Annotated')
+        self.assertEqual(self.user.full_name, 'Candidate Beer')
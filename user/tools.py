@@ -1,7 +1,12 @@
 import logging
 import hashlib
+
+import jwt
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_jwt.settings import api_settings
 
+from user.auth_cache import auth_user_cache
 from user.serializers import JWTUserPayloadSerializer
 
 logger = logging.getLogger('app')
@@ -25,3 +30,24 @@ def jwt_get_user_secret_key(user):
     skey = s_common + s_jwt + pass_hash
     sha = hashlib.sha512(skey.encode()).hexdigest()
     return sha
+
+
+def jwt_decode_handler(token):
+    """rest_framework_jwt.utils.jwt_decode_handler taking per-user secret from user.auth_cache"""
+
+    unverified_payload = jwt.decode(token, None, False)
+    try:
+        secret_key = auth_user_cache.resolve(unverified_payload.get('user_id'))[1]
+    except get_user_model().DoesNotExist:
+        raise jwt.InvalidTokenError()
+
+    return jwt.decode(
+        token,
+        api_settings.JWT_PUBLIC_KEY or secret_key,
+        api_settings.JWT_VERIFY,
+        options={'verify_exp': api_settings.JWT_VERIFY_EXPIRATION},
+        leeway=api_settings.JWT_LEEWAY,
+        audience=api_settings.JWT_AUDIENCE,
+        issuer=api_settings.JWT_ISSUER,
+        algorithms=[api_settings.JWT_ALGORITHM]
+    )
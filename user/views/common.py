@@ -13,7 +13,9 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from budget.conditional import conditional_response, make_etag
 import user.serializers as serializers
+from user.auth_cache import auth_user_cache
 from user.models import User, UsersSingUp
 
 log = logging.getLogger('app')
@@ -186,12 +188,19 @@ class JWTUserPayloadView(APIView):
           "firstName": "Тор",
           "lastName": "Израгнарока"
         }
+    ##Кеширование:
+        Ответ содержит ETag, с заголовком If-None-Match возвращается 304, пока пользователь не изменился
     """
     permission_classes = (IsAuthenticated, )
 
     def get(self, request, format=None):
 
         user = request.user
-        serializer = serializers.JWTUserPayloadSerializer(instance=user, context=request)
-        return Response(serializer.data)
+        # request.user may come from auth_user_cache, its version is bumped on every write of the row
+        etag = make_etag('self-info', user.pk, auth_user_cache.get_version(user.pk))
+        return conditional_response(
+            request,
+            etag,
+            lambda: Response(serializers.JWTUserPayloadSerializer(instance=user, context=request).data),
+        )
 
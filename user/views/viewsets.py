@@ -1,10 +1,15 @@
-import redis
 from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from budget.conditional import conditional_response, make_etag
+from common.models import push_templates
+from user import counters
+from user.auth_cache import auth_user_cache
+from user.filters import HierarchyPermissionFilterBackend
 from user.models import User, Notification
+from user.pagination import KeysetPagination
 from user.permissions import (
     BudgetViewSetPermission
 )
@@ -17,8 +22,6 @@ from user.serializers import (
     NotificationSerializer,
 )
 
-REDIS_CLIENT = redis.Redis()
-
 
 class ProfileViewSet(mixins.CreateModelMixin,
                      mixins.UpdateModelMixin,
@@ -33,6 +36,7 @@ class ProfileViewSet(mixins.CreateModelMixin,
 
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated, BudgetViewSetPermission)
+    filter_backends = (HierarchyPermissionFilterBackend,)
     queryset = User.objects.all()
 
     def get_serializer_class(self):
@@ -48,6 +52,18 @@ class ProfileViewSet(mixins.CreateModelMixin,
             return UpdateUserSerializer
         return super().get_serializer_class()
 
+    def get_profile(self):
+        """
+        Same as get_object, but when user asks about himself
+        request.user is used and no query is made.
+        """
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if str(self.kwargs.get(lookup_url_kwarg)) == str(self.request.user.pk):
+            self.check_object_permissions(self.request, self.request.user)
+            return self.request.user
+        return self.get_object()
+
     @action(methods=['post'], url_path='invite-again', url_name='invite-again', detail=True)
     def invite_again(self, request, *args, **kwargs):
         """Повторная отправка приглашения"""
@@ -62,7 +78,12 @@ class ProfileViewSet(mixins.CreateModelMixin,
 
     @action(methods=['post'], url_path='set-firebase-token', url_name='set-firebase-token', detail=True)
     def set_firebase_token(self, request, *args, **kwargs):
-        """Установка FirebaseToken пользователю"""
+        """
+        Установка FirebaseToken пользователю
+
+        Токенов (устройств) у пользователя может быть несколько,
+        повторная установка токена обновляет время активности устройства
+        """
 
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
@@ -80,10 +101,16 @@ class ProfileViewSet(mixins.CreateModelMixin,
         Тексты шаблонов уведомлений правятся в админке
 
         ## Пагинация
-        * **page** - **__int__** - номер страницы
+        * **cursor** - **__str__** - курсор следующей страницы (берется из ссылки **next**)
         * **size** - **__int__** - размер страницы
 
+        ## Кеширование
+        Ответ содержит **ETag**, с заголовком **If-None-Match** возвращается 304,
+        пока уведомления не изменились (непрочитанные при этом не сбрасываются)
+
         ## Данные ответа
+        * **next** - **__str__** - ссылка на следующую страницу, null на последней
+        * **results** - **__list__** - уведомления:
         * **id** - **__int__** - id уведомления
         * **user** - **__obj__** - объект юзера
         * **created** - **__date__** - дата записи уведомления "2019-07-09T03:52:28.901528+03:00"
@@ -99,20 +126,30 @@ class ProfileViewSet(mixins.CreateModelMixin,
 
         """
 
-        user = self.get_object()
+        user = self.get_profile()
+
+        paginator = KeysetPagination()
+        etag = make_etag(
+            'notifications',
+            user.pk,
+            # user row is a part of every item, rows not backfilled are rendered with push templates
+            auth_user_cache.get_version(user.pk),
+            push_templates.version.get(),
+            counters.get_version(user.pk),
+            request.query_params.get(paginator.cursor_query_param, ''),
+            paginator.get_page_size(request),
+        )
+        return conditional_response(request, etag, lambda: self._get_notifications_page(user, paginator))
 
+    def _get_notifications_page(self, user, paginator):
         notifications = Notification.objects.filter(
             user=user
-        )
-        REDIS_CLIENT.set(f'messages_{user.id}', notifications.count())
+        ).select_related('user')
+        counters.mark_read(user.id)
 
-        page = self.paginate_queryset(notifications)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        else:
-            serializer = self.get_serializer(notifications, many=True)
-            return Response(serializer.data)
+        page = paginator.paginate_queryset(notifications, self.request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(methods=['get'], url_path='new-notifications', url_name='new-notifications', detail=True)
     def new_notifications_count(self, request, *args, **kwargs):
@@ -126,12 +163,6 @@ class ProfileViewSet(mixins.CreateModelMixin,
 
         """
 
-        user = self.get_object()
-
-        notification_count = Notification.objects.filter(user=user).count()
-
-        messages_count = REDIS_CLIENT.get(f'messages_{user.id}') or 0
-        messages_count = notification_count - int(messages_count)
-        REDIS_CLIENT.set(f'messages_{user.id}', messages_count if messages_count > 0 else notification_count)
+        user = self.get_profile()
 
-        return Response(data={'new_messages': messages_count if messages_count > 0 else 0})
+        return Response(data={'new_messages': counters.get_unread(user.id)})